@@ -0,0 +1,200 @@
+"""
+Solve many cubes at once.
+
+Every non-empty line of the input is one problem in the cube_problem.txt format
+(T:... F:... R:... A:... L:... B:...). Problems are spread over a pool of worker
+processes; each worker loads the solver's tables once, when it starts, and then
+solves one problem per task under an optional per-task timeout.
+
+    python batch.py problems.txt [--solver two-phase] [--workers 8] [--timeout 5] [--max-states N] [--unordered]
+
+writes one line per problem: its line number, a status and the moves as
+face/direction pairs, e.g. "3 solved F C T A R 2".
+"""
+import argparse
+import os
+import signal
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from endgame import default_table, table_first
+from ida_star import ida_star_solve
+from partB import (Cube, SearchLimitExceeded, SearchLimits, bfs_pruning, bidirectional_solve, checked_buffer,
+                   format_moves, parse_cube_state)
+from pattern_db import default_databases
+from two_phase import default_tables, two_phase_solve
+
+SOLVERS = {
+    'two-phase': two_phase_solve,
+    'ida': ida_star_solve,
+    'bidirectional': bidirectional_solve,
+    'bfs': bfs_pruning,
+}
+# Tables a solver needs, loaded when a worker starts rather than on its first task.
+_WARM_UP = {
+    'two-phase': default_tables,
+    'ida': default_databases,
+}
+
+# status is 'solved', 'unsolved' (the solver gave up), 'timeout', 'limit' (a SearchLimits bound was
+# reached) or 'invalid' (bad input line).
+BatchResult = namedtuple('BatchResult', ['index', 'line', 'status', 'moves', 'error', 'seconds'])
+
+class TaskTimeout(Exception):
+    pass
+
+_solver = None
+
+def _init_worker(solver_name, endgame=False):
+    global _solver
+    _solver = SOLVERS[solver_name]
+    warm_up = _WARM_UP.get(solver_name)
+    if warm_up is not None:
+        warm_up()
+    if endgame:
+        _solver = table_first(_solver, default_table())
+
+def _raise_timeout(signum, frame):
+    raise TaskTimeout()
+
+def _solve_task(index, line, timeout, limits=None):
+    """limits: the arguments of a SearchLimits made for this task, or None."""
+    start = time.perf_counter()
+    if timeout:
+        signal.signal(signal.SIGALRM, _raise_timeout)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        cube = Cube(state=parse_cube_state(line))
+        moves = _solver(cube) if limits is None else _solver(cube, limits=SearchLimits(*limits))
+        status, error = ('solved', None) if moves is not None else ('unsolved', None)
+    except TaskTimeout:
+        moves, status, error = None, 'timeout', f"no solution within {timeout}s"
+    except SearchLimitExceeded as e:
+        detail = e.reason if e.stats is None else f"{e.reason} reached after {e.stats.visited} states"
+        moves, status, error = None, 'limit', detail
+    except ValueError as e:
+        moves, status, error = None, 'invalid', str(e)
+    finally:
+        if timeout:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+    return BatchResult(index, line, status, moves, error, time.perf_counter() - start)
+
+def _reject(index, line):
+    """
+    An 'invalid' BatchResult when the line is not a solvable cube state, else None.
+    Checked in the parent, so a bad line never takes up a worker.
+    """
+    start = time.perf_counter()
+    try:
+        checked_buffer(Cube(state=parse_cube_state(line)))
+    except ValueError as e:
+        return BatchResult(index, line, 'invalid', None, str(e), time.perf_counter() - start)
+    return None
+
+def read_problems(stream):
+    """Yield (line number, line) for every non-empty line, reading the stream lazily."""
+    for index, line in enumerate(stream, 1):
+        line = line.strip()
+        if line:
+            yield index, line
+
+def solve_batch(problems, solver='two-phase', workers=None, timeout=None, ordered=True, endgame=False,
+                max_states=None, max_bytes=None, fallback=False):
+    """
+    Solve (index, line) problems in a process pool and yield a BatchResult for each.
+    workers: number of processes (default: one per core, 0 solves in this process).
+    timeout: seconds allowed per problem (None for no limit); needs SIGALRM, i.e. a Unix host.
+    ordered: yield results in input order; otherwise as soon as each one is done.
+    endgame: answer states near solved from the near-solved table (see endgame.py) first.
+    max_states / max_bytes: memory bounds per problem for the BFS solvers (see partB.SearchLimits),
+    so one bad problem cannot exhaust a worker; with fallback such a problem is retried with IDA*.
+    At most a few tasks per worker are in flight, so the input is read as it is consumed.
+    """
+    if solver not in SOLVERS:
+        raise ValueError(f"Unknown solver: {solver}")
+    if timeout and not hasattr(signal, 'setitimer'):
+        raise ValueError("Per-task timeouts need signal.setitimer, which this platform lacks")
+    limits = None
+    if max_states is not None or max_bytes is not None:
+        limits = (max_states, max_bytes, None, None, fallback)
+    if workers == 0:
+        _init_worker(solver, endgame)
+        for index, line in problems:
+            yield _solve_task(index, line, timeout, limits)
+        return
+
+    workers = workers or os.cpu_count() or 1
+    window = 4 * workers
+    problems = iter(problems)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(solver, endgame)) as pool:
+        pending = set()
+        order = []      # submitted or rejected indices, oldest first (ordered mode)
+        done = {}       # finished results not yet yielded (ordered mode)
+        exhausted = False
+        while True:
+            # In ordered mode, finished results wait in done behind a slow head of line,
+            # so everything submitted but not yet yielded counts against the window.
+            while not exhausted and (len(order) if ordered else len(pending)) < window:
+                problem = next(problems, None)
+                if problem is None:
+                    exhausted = True
+                    break
+                rejected = _reject(*problem)
+                if rejected is not None:
+                    if ordered:
+                        done[problem[0]] = rejected
+                        order.append(problem[0])
+                    else:
+                        yield rejected
+                    continue
+                pending.add(pool.submit(_solve_task, problem[0], problem[1], timeout, limits))
+                if ordered:
+                    order.append(problem[0])
+            if ordered:
+                while order and order[0] in done:
+                    yield done.pop(order.pop(0))
+            if not pending:
+                if exhausted:
+                    break
+                continue  # The window was filled by rejected lines, now yielded.
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                result = future.result()
+                if ordered:
+                    done[result.index] = result
+                else:
+                    yield result
+
+def format_result(result):
+    """One output line: index, status, then the moves or the error message."""
+    if result.status == 'solved':
+        detail = format_moves(result.moves)
+    else:
+        detail = result.error or ''
+    return f"{result.index} {result.status} {detail}".rstrip()
+
+# --- Main function ---
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Solve every cube state in a file, one per line.")
+    parser.add_argument('input', help="problem file, or - for standard input")
+    parser.add_argument('--solver', choices=sorted(SOLVERS), default='two-phase')
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: one per core)")
+    parser.add_argument('--timeout', type=float, default=None, help="seconds allowed per problem")
+    parser.add_argument('--max-states', type=int, default=None, help="visited states allowed per problem")
+    parser.add_argument('--max-bytes', type=int, default=None, help="estimated search memory allowed per problem")
+    parser.add_argument('--fallback', action='store_true', help="retry with IDA* when a memory limit is reached")
+    parser.add_argument('--unordered', action='store_true', help="write results as they complete")
+    parser.add_argument('--endgame', action='store_true', help="look up states near solved in the near-solved table first")
+    parser.add_argument('--out', default=None, help="output file (default: standard output)")
+    args = parser.parse_args()
+
+    source = sys.stdin if args.input == '-' else open(args.input, 'r')
+    out = sys.stdout if args.out is None else open(args.out, 'w')
+    with source, out:
+        results = solve_batch(read_problems(source), args.solver, args.workers, args.timeout,
+                              ordered=not args.unordered, endgame=args.endgame, max_states=args.max_states,
+                              max_bytes=args.max_bytes, fallback=args.fallback)
+        for result in results:
+            out.write(format_result(result) + "\n")
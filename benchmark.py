@@ -0,0 +1,261 @@
+"""
+Reproducible benchmarks for the move engines, the visited sets and the solvers.
+
+    python benchmark.py [--seed 1] [--max-depth 6] [--samples 20] [--out results.json]
+
+Scrambles are drawn from a seeded random generator and applied with
+Cube.move_cube, so the same seed gives the same problems on every machine and
+release. Every scramble is a canonical move sequence (see partB.ALLOWED_NEXT),
+so a depth-d scramble is at most d moves from solved. Results are written as
+JSON: throughput figures, peak RSS, and p50/p95/p99 latency per solver and depth.
+
+Each solver is timed in a fresh process of its own, so its peak RSS is its own:
+rss_kb_ready is that process once its tables are loaded, peak_rss_kb after the
+last solve, and the difference is the memory the searches themselves took.
+parallel_bfs expands its layers in worker processes of its own, whose memory
+is not in these figures. vectorized_bfs is only timed when NumPy is installed.
+"""
+import argparse
+import copy
+import json
+import math
+import multiprocessing
+import platform
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from cubie import encode_state
+from endgame import default_table
+from external_bfs import external_bfs_solve
+from ida_star import ida_star_solve
+from partB import (ALLOWED_NEXT, MOVES, QUARTER_TURN_IDS, START_MOVE, Cube, LayeredStateSet, PackedStateSet,
+                   apply_move, bfs, bfs_pruning, bfs_solve, bidirectional_solve, buffer_to_cube, cube_to_buffer,
+                   expand)
+from parallel_bfs import parallel_bfs_solve
+from pattern_db import default_databases
+from two_phase import default_tables, two_phase_solve
+from vectorized import np, vectorized_bfs_solve
+
+_scratch_dir = None
+
+def _external_work_dir():
+    """The layer directory of external_bfs_solve, one per timing process, removed by _time_solver."""
+    global _scratch_dir
+    if _scratch_dir is None:
+        _scratch_dir = tempfile.mkdtemp(prefix='benchmark_layers_')
+    return _scratch_dir
+
+# Solver entry points, the deepest scramble each is run on (beyond that they take
+# minutes) and the tables it loads before the clock starts. external_bfs keeps the
+# layers it builds for the later scrambles, as it does between real calls.
+SOLVERS = {
+    'bfs': (bfs, 3, ()),
+    'bfs_solve': (bfs_solve, 4, ()),
+    'bfs_pruning': (bfs_pruning, 4, ()),
+    'parallel_bfs': (parallel_bfs_solve, 4, ()),
+    'external_bfs': (lambda cube: external_bfs_solve(cube, _external_work_dir()), 5, ()),
+    'bidirectional': (bidirectional_solve, 8, ()),
+    'bidirectional+endgame': (lambda cube: bidirectional_solve(cube, endgame=default_table()), 9, (default_table,)),
+    'ida_star': (ida_star_solve, 9, (default_databases,)),
+    'two_phase': (two_phase_solve, 20, (default_tables,)),
+}
+if np is not None:
+    SOLVERS['vectorized_bfs'] = (vectorized_bfs_solve, 5, ())
+
+def scramble(rng, depth):
+    """A Cube scrambled with depth canonical moves drawn from rng, and the move ids used."""
+    cube = Cube()
+    move_ids = []
+    last_move = START_MOVE
+    for _ in range(depth):
+        last_move = rng.choice(ALLOWED_NEXT[last_move])
+        move_ids.append(last_move)
+        cube.move_cube(*MOVES[last_move])
+    return cube, move_ids
+
+def percentile(values, p):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+def peak_rss_kb():
+    """Peak resident set size of this process so far, in KiB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == 'darwin' else peak  # bytes on macOS, KiB on Linux
+
+def _rate(count, seconds):
+    return count / seconds if seconds else float('inf')
+
+# --- Throughput ---
+
+def bench_moves(rng, count):
+    """Single moves per second with Cube.move_cube and with the permutation engine."""
+    move_ids = [rng.randrange(len(MOVES)) for _ in range(count)]
+    cube = Cube()
+    start = time.perf_counter()
+    for move_id in move_ids:
+        cube.move_cube(*MOVES[move_id])
+    cube_seconds = time.perf_counter() - start
+    buffer = cube_to_buffer(Cube())
+    start = time.perf_counter()
+    for move_id in move_ids:
+        buffer = apply_move(buffer, move_id)
+    buffer_seconds = time.perf_counter() - start
+    return {'cube_move_cube': _rate(count, cube_seconds), 'permutation_engine': _rate(count, buffer_seconds)}
+
+def _deepcopy_neighbors(cube):
+    """The children of cube the way Cube.get_neighbors made them before the permutation engine."""
+    neighbors = []
+    for move in (MOVES[move_id] for move_id in QUARTER_TURN_IDS):
+        new_cube = copy.deepcopy(cube)
+        new_cube.move_cube(*move)
+        neighbors.append((new_cube.get_state_tuple(), move))
+    return neighbors
+
+def bench_expansions(rng, count):
+    """
+    Neighbour expansions (all children of one state) per second, per engine: the
+    original deepcopy and Cube.move_cube per quarter turn, Cube.get_neighbors (now
+    built on expand, with state tuples as output) and expand itself.
+    """
+    states = [scramble(rng, 20)[0] for _ in range(count)]
+    start = time.perf_counter()
+    for cube in states:
+        _deepcopy_neighbors(cube)
+    deepcopy_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    for cube in states:
+        cube.get_neighbors()
+    neighbors_seconds = time.perf_counter() - start
+    buffers = [cube_to_buffer(cube) for cube in states]
+    start = time.perf_counter()
+    for buffer in buffers:
+        expand(buffer, range(len(MOVES)))
+    expand_seconds = time.perf_counter() - start
+    return {'deepcopy_move_cube_12_moves': _rate(count, deepcopy_seconds),
+            'cube_get_neighbors_18_moves': _rate(count, neighbors_seconds),
+            'expand_18_moves': _rate(count, expand_seconds)}
+
+def bench_visited(rng, count):
+    """
+    Inserts per second into a set of sticker buffers and into a PackedStateSet and a
+    LayeredStateSet (one sealed layer) of state codes, and the bytes per state of the latter two.
+    """
+    buffers = [cube_to_buffer(scramble(rng, 20)[0]) for _ in range(count)]
+    visited = set()
+    start = time.perf_counter()
+    for buffer in buffers:
+        visited.add(buffer)
+    set_seconds = time.perf_counter() - start
+    packed = PackedStateSet()
+    start = time.perf_counter()
+    for buffer in buffers:
+        packed.add(encode_state(buffer))
+    packed_seconds = time.perf_counter() - start
+    layered = LayeredStateSet()
+    start = time.perf_counter()
+    for buffer in buffers:
+        layered.add(encode_state(buffer))
+    layered.seal()
+    layered_seconds = time.perf_counter() - start
+    return {'set_of_buffers': _rate(count, set_seconds), 'packed_state_set': _rate(count, packed_seconds),
+            'packed_state_set_bytes_per_state': packed.nbytes / max(1, len(packed)),
+            'layered_state_set': _rate(count, layered_seconds),
+            'layered_state_set_bytes_per_state': layered.nbytes / max(1, len(layered))}
+
+# --- Latency ---
+
+def _time_solver(name, problems):
+    """
+    Run in a fresh process by bench_solvers: load the solver's tables, then time it
+    on the problems (sticker buffers per depth). Returns (per-depth figures, RSS in
+    KiB once ready, peak RSS in KiB).
+    """
+    solver, _, setup = SOLVERS[name]
+    for load in setup:
+        load()
+    rss_ready = peak_rss_kb()
+    try:
+        per_depth = _time_depths(solver, problems)
+    finally:
+        if _scratch_dir is not None:
+            shutil.rmtree(_scratch_dir, ignore_errors=True)
+    return per_depth, rss_ready, peak_rss_kb()
+
+def _time_depths(solver, problems):
+    per_depth = {}
+    for depth, buffers in problems.items():
+        latencies, lengths = [], []
+        for buffer in buffers:
+            cube = buffer_to_cube(buffer)
+            start = time.perf_counter()
+            solution_moves = solver(cube)
+            latencies.append(time.perf_counter() - start)
+            lengths.append(len(solution_moves) if solution_moves is not None else None)
+        per_depth[depth] = {
+            'samples': len(latencies),
+            'p50': percentile(latencies, 50),
+            'p95': percentile(latencies, 95),
+            'p99': percentile(latencies, 99),
+            'mean_length': (sum(n for n in lengths if n is not None) / max(1, sum(n is not None for n in lengths))),
+            'unsolved': sum(n is None for n in lengths),
+        }
+    return per_depth
+
+def bench_solvers(rng, max_depth, samples, solvers):
+    """
+    p50/p95/p99 solve latency in seconds per solver and scramble depth, and the
+    RSS of each solver's own process (see the module docstring).
+    """
+    problems = {depth: [cube_to_buffer(scramble(rng, depth)[0]) for _ in range(samples)]
+                for depth in range(1, max_depth + 1)}
+    context = multiprocessing.get_context('spawn')  # a clean process: nothing inherited from this one
+    results = {}
+    for name in solvers:
+        solver_problems = {depth: problems[depth] for depth in range(1, min(max_depth, SOLVERS[name][1]) + 1)}
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            per_depth, rss_ready, peak = pool.submit(_time_solver, name, solver_problems).result()
+        results[name] = {'depths': per_depth, 'rss_kb_ready': rss_ready, 'peak_rss_kb': peak,
+                         'search_rss_kb': peak - rss_ready}
+    return results
+
+def run(seed=1, max_depth=6, samples=20, solvers=None, throughput_count=20000):
+    """Run every benchmark and return the report as a dict."""
+    solvers = list(SOLVERS) if solvers is None else solvers
+    report = {
+        'seed': seed,
+        'max_depth': max_depth,
+        'samples': samples,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        # Each part draws from its own generator, so its inputs do not depend on the other parts.
+        'moves_per_second': bench_moves(random.Random(seed), throughput_count),
+        'expansions_per_second': bench_expansions(random.Random(seed), throughput_count // 10),
+        'visited_inserts_per_second': bench_visited(random.Random(seed), throughput_count // 10),
+        'solve_latency': bench_solvers(random.Random(seed), max_depth, samples, solvers),
+    }
+    report['peak_rss_kb'] = peak_rss_kb()  # of this process: the throughput benchmarks
+    return report
+
+# --- Main function ---
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the move engines and the solvers.")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--max-depth', type=int, default=6, help="deepest scramble to time")
+    parser.add_argument('--samples', type=int, default=20, help="scrambles per depth")
+    parser.add_argument('--solver', action='append', choices=sorted(SOLVERS), help="solver to time, may be repeated")
+    parser.add_argument('--out', default=None, help="JSON output file (default: standard output)")
+    args = parser.parse_args()
+
+    report = run(args.seed, args.max_depth, args.samples, args.solver)
+    text = json.dumps(report, indent=2)
+    if args.out is None:
+        print(text)
+    else:
+        with open(args.out, 'w') as file:
+            file.write(text + "\n")
@@ -0,0 +1,110 @@
+"""
+Regression checks of the face turns, for both Cube classes and the permutation engine.
+
+    python check_moves.py [--scrambles 1000] [--seed 1]
+
+Checks that every face turn has order 4 (four quarter turns are the identity:
+a wrong sticker mapping such as the old Front_Clockwise, which cycled eight
+stickers, fails it), that the sexy move (R U R' U', here R C, T C, R A, T A)
+repeated six times is the identity, that partA.Cube, partB.Cube and the move
+permutations agree on every quarter turn, and that random scrambles stay valid
+cubes (cubie.validate_buffer). Prints one line per check and exits with status 1
+on the first failure.
+"""
+import argparse
+import random
+import sys
+
+import partA
+from cubie import validate_buffer
+from move_compiler import MoveSequence, permutation_order
+from partB import MOVE_PERMS, MOVES, QUARTER_TURN_IDS, SOLVED_BUFFER, Cube, apply_move, buffer_to_cube, cube_to_buffer
+
+FACES = ['T', 'B', 'F', 'A', 'L', 'R']
+SEXY_MOVE = [('R', 'C'), ('T', 'C'), ('R', 'A'), ('T', 'A')]
+
+def random_buffer(rng, depth=30):
+    """The sticker buffer of a random sequence of depth moves from solved."""
+    buffer = SOLVED_BUFFER
+    for _ in range(depth):
+        buffer = apply_move(buffer, rng.randrange(len(MOVES)))
+    return buffer
+
+def partA_cube(buffer):
+    """A partA.Cube with the stickers of a buffer."""
+    return partA.Cube(state={face: list(stickers) for face, stickers in buffer_to_cube(buffer).state.items()})
+
+def check(condition, message):
+    if not condition:
+        raise AssertionError(message)
+
+# --- Checks ---
+
+def check_face_orders(rng):
+    """Four clockwise turns of any face give back the cube, and no fewer do."""
+    for move_id in QUARTER_TURN_IDS:
+        check(permutation_order(MOVE_PERMS[move_id]) == 4, f"{' '.join(MOVES[move_id])} does not have order 4")
+    start = random_buffer(rng)
+    for cube_class in (Cube, partA.Cube):
+        for face in FACES:
+            cube = buffer_to_cube(start) if cube_class is Cube else partA_cube(start)
+            for turn in range(1, 5):
+                cube.move_cube(face, 'C')
+                check((cube.get_state_tuple() == buffer_to_cube(start).get_state_tuple()) == (turn == 4),
+                      f"{cube_class.__module__}: {face} C has not order 4")
+
+def check_sexy_move(rng):
+    """(R U R' U') six times is the identity, and not before."""
+    sequence = MoveSequence.from_moves(SEXY_MOVE)
+    check(permutation_order(sequence.perm) == 6, "R C, T C, R A, T A does not have order 6")
+    start = random_buffer(rng)
+    for cube_class in (Cube, partA.Cube):
+        cube = buffer_to_cube(start) if cube_class is Cube else partA_cube(start)
+        for _ in range(6):
+            for move in SEXY_MOVE:
+                cube.move_cube(*move)
+        check(cube.get_state_tuple() == buffer_to_cube(start).get_state_tuple(),
+              f"{cube_class.__module__}: (R C, T C, R A, T A) x 6 is not the identity")
+
+def check_engines_agree(rng, count):
+    """partA.Cube, partB.Cube and apply_move give the same stickers for every quarter turn."""
+    for _ in range(count):
+        buffer = random_buffer(rng)
+        for move_id in QUARTER_TURN_IDS:
+            expected = apply_move(buffer, move_id)
+            for cube in (buffer_to_cube(buffer), partA_cube(buffer)):
+                cube.move_cube(*MOVES[move_id])
+                check(cube_to_buffer(cube) == expected,
+                      f"{type(cube).__module__}: {' '.join(MOVES[move_id])} differs from the permutation engine")
+
+def check_scrambles_valid(rng, count):
+    """Random scrambles of every length up to 40 moves are valid cubes."""
+    for index in range(count):
+        buffer = random_buffer(rng, index % 41)
+        validate_buffer(buffer)
+
+def run_checks(scrambles=1000, seed=1):
+    """Run every check; raises AssertionError (or cubie.InvalidCubeError) on the first failure."""
+    rng = random.Random(seed)
+    checks = [
+        ('face turns have order 4', lambda: check_face_orders(rng)),
+        ('(R C, T C, R A, T A) x 6 is the identity', lambda: check_sexy_move(rng)),
+        ('partA, partB and the permutation engine agree', lambda: check_engines_agree(rng, scrambles // 10)),
+        (f'{scrambles} random scrambles are valid cubes', lambda: check_scrambles_valid(rng, scrambles)),
+    ]
+    for name, run in checks:
+        run()
+        print(f"ok  {name}")
+
+# --- Main function ---
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Regression checks of the face turns.")
+    parser.add_argument('--scrambles', type=int, default=1000, help="random scrambles to validate")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    try:
+        run_checks(args.scrambles, args.seed)
+    except (AssertionError, ValueError) as e:
+        print(f"FAILED  {e}")
+        sys.exit(1)
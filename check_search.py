@@ -0,0 +1,127 @@
+"""
+Regression checks of the search subsystems, in the style of check_moves.py.
+
+    python check_search.py [--seed 1]
+
+Each check runs the real code on small inputs and compares it with a plain
+reference: the compact visited sets of bfs_pruning, the state limits of the BFS
+solvers, the symmetry classes, the symmetric near-solved table, the two-phase
+solver and the NumPy layers (skipped without NumPy).
+Prints one line per check and exits with status 1 on the first failure.
+"""
+import argparse
+import random
+import sys
+
+from check_moves import check, random_buffer
+from cubie import encode_state, pack_state
+from endgame import NearSolvedTable
+from partB import (MOVE_IDS, SOLVED_BUFFER, LayeredStateSet, PackedStateSet, SearchLimitExceeded, SearchLimits,
+                   apply_move, apply_moves, bfs, bfs_pruning, bfs_solve, bidirectional_solve, buffer_to_cube)
+from symmetry import N_SYMMETRIES, apply_symmetry, canonical_code
+from two_phase import two_phase_solve
+from vectorized import layer_sizes, np, state_codes, to_array
+
+# --- Checks ---
+
+def check_compact_backends(rng, max_depth=3, count=3):
+    """bfs_pruning finds solutions of the same length with a PackedStateSet and a LayeredStateSet as with a set."""
+    for depth in range(max_depth + 1):
+        for _ in range(count):
+            buffer = random_buffer(rng, depth)
+            expected = len(bfs_pruning(buffer_to_cube(buffer)))
+            for visited in (PackedStateSet(), LayeredStateSet()):
+                solution_moves = bfs_pruning(buffer_to_cube(buffer), visited=visited)
+                check(len(solution_moves) == expected,
+                      f"{type(visited).__name__}: {len(solution_moves)} moves instead of {expected}")
+                check(apply_moves(buffer, [MOVE_IDS[move] for move in solution_moves]) == SOLVED_BUFFER,
+                      f"{type(visited).__name__}: the solution does not solve the cube")
+
+def check_symmetry_classes(rng, count=20):
+    """All 48 conjugates of a state have the same canonical code, and conjugating keeps a cube valid."""
+    for _ in range(count):
+        buffer = random_buffer(rng)
+        code = canonical_code(buffer)
+        for sym in range(N_SYMMETRIES):
+            conjugate = apply_symmetry(buffer, sym)
+            encode_state(conjugate)  # raises on an impossible cube
+            check(canonical_code(conjugate) == code, f"conjugate {sym} has another canonical code")
+
+def check_symmetric_table(rng, depth=4, count=200):
+    """A symmetric near-solved table gives the distances of the plain one and solutions of that length."""
+    plain = NearSolvedTable.generate(depth)
+    symmetric = NearSolvedTable.generate(depth, symmetric=True)
+    check(len(symmetric) < len(plain) / 40, f"{len(symmetric)} classes for {len(plain)} states")
+    for _ in range(count):
+        buffer = random_buffer(rng, rng.randrange(depth + 3))
+        distance = plain.distance(buffer)
+        check(symmetric.distance(buffer) == distance, "symmetric and plain tables disagree on a distance")
+        if distance is not None:
+            path = symmetric.solve_buffer(buffer)
+            check(len(path) == distance, f"{len(path)}-move solution of a state {distance} moves from solved")
+            for move_id in path:
+                buffer = apply_move(buffer, move_id)
+            check(buffer == SOLVED_BUFFER, "a symmetric table solution does not solve its state")
+
+def check_two_phase(rng, count=20):
+    """two_phase_solve returns a solution of at most 30 moves for random cubes."""
+    for _ in range(count):
+        buffer = random_buffer(rng)
+        solution_moves = two_phase_solve(buffer_to_cube(buffer))
+        check(len(solution_moves) <= 30, f"{len(solution_moves)}-move two-phase solution")
+        check(apply_moves(buffer, [MOVE_IDS[move] for move in solution_moves]) == SOLVED_BUFFER,
+              "a two-phase solution does not solve its cube")
+
+def check_vectorized_layers(rng, count=50):
+    """The NumPy layers have the known sizes, and their codes are those of cubie.encode_state."""
+    sizes = layer_sizes(4)
+    check(sizes == [1, 18, 243, 3240, 43239], f"layer sizes {sizes}")
+    buffers = [random_buffer(rng) for _ in range(count)]
+    check(state_codes(to_array(buffers)) == b''.join(pack_state(encode_state(buffer)) for buffer in buffers),
+          "state_codes differs from cubie.encode_state")
+
+def check_state_limits(rng, max_states=500):
+    """Every BFS solver stops within one state of max_states."""
+    solvers = [('bfs', bfs), ('bfs_solve', bfs_solve), ('bfs_pruning', bfs_pruning),
+               ('bfs_pruning/LayeredStateSet', lambda cube, **kwargs: bfs_pruning(cube, LayeredStateSet(), **kwargs)),
+               ('bidirectional_solve', bidirectional_solve)]
+    buffer = random_buffer(rng)
+    for name, solver in solvers:
+        try:
+            solver(buffer_to_cube(buffer), limits=SearchLimits(max_states=max_states))
+        except SearchLimitExceeded as e:
+            check(e.reason == 'max_states', f"{name} stopped for {e.reason}")
+            check(e.stats.visited <= max_states + 1, f"{name} stopped at {e.stats.visited} states, not {max_states}")
+        else:
+            raise AssertionError(f"{name} solved a 30-move scramble within {max_states} states")
+
+def run_checks(seed=1):
+    """Run every check; raises AssertionError on the first failure. The NumPy checks are skipped without it."""
+    rng = random.Random(seed)
+    checks = [
+        ('compact visited sets give optimal solutions', lambda: check_compact_backends(rng), False),
+        ('BFS solvers honour max_states', lambda: check_state_limits(rng), False),
+        ('the 48 conjugates of a state share its canonical code', lambda: check_symmetry_classes(rng), False),
+        ('symmetric near-solved tables match plain ones', lambda: check_symmetric_table(rng), False),
+        ('two-phase solutions solve random cubes', lambda: check_two_phase(rng), False),
+        ('vectorized layers and codes match the known counts and cubie codes', lambda: check_vectorized_layers(rng),
+         True),
+    ]
+    for name, run, needs_numpy in checks:
+        if needs_numpy and np is None:
+            print(f"--  {name}: skipped, NumPy is not installed")
+            continue
+        run()
+        print(f"ok  {name}")
+
+# --- Main function ---
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Regression checks of the search subsystems.")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    try:
+        run_checks(args.seed)
+    except (AssertionError, ValueError) as e:
+        print(f"FAILED  {e}")
+        sys.exit(1)
@@ -0,0 +1,207 @@
+"""
+Seeded generator of random cube states and scrambles, for benchmark and regression corpora.
+
+Two kinds of corpus:
+
+  states     uniformly random states. Every integer in range(cubie.N_STATES) is
+             the code of exactly one solvable state, so a random state is a
+             random code: random bytes, masked to the bit length of N_STATES
+             and rejected above it, already in packed form.
+  scrambles  random canonical move sequences of a given depth (see
+             partB.ALLOWED_NEXT) applied to the solved cube at cubie level;
+             each state is at most depth moves from solved.
+
+Work is done in batches of batch_size records. Batch i draws from its own
+generator, seeded with (seed, i), so a corpus depends only on the seed, the
+count and the batch size: not on the number of worker processes, nor on NumPy,
+which is used when it is installed to do each batch in array operations.
+
+    python corpus.py OUT [--count 1000000] [--depth 20] [--seed 1] [--format binary|text|scramble] [--workers 8]
+
+Formats: binary is a cubefile.py file (with the scramble moves of each record
+for scrambles); text is one state line per record, the input of batch.py;
+scramble is the solved state followed by the move lines, as in
+scramble_moves.txt, for partB.scramble_stream.
+"""
+import argparse
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+
+from cubie import N_STATES, SOLVED_CUBIES, STATE_BYTES, decode_state, encode_cubies, pack_state
+from cubefile import CubeFileWriter
+from partB import ALLOWED_NEXT, CUBIE_MOVES, MOVES, START_MOVE, Cube, buffer_to_cube
+from vectorized import cubie_codes
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+DEFAULT_BATCH = 1 << 14  # records per batch
+FORMATS = ('binary', 'text', 'scramble')
+
+# A state code in STATE_BYTES big-endian bytes: only the low bits of the first byte can be set.
+_FIRST_BYTE_MASK = (1 << (N_STATES.bit_length() - 8 * (STATE_BYTES - 1))) - 1
+
+if np is not None:
+    _N_HIGH, _N_LOW = N_STATES >> 64, N_STATES & ((1 << 64) - 1)
+    _MOVE_CP = np.array([move[0] for move in CUBIE_MOVES], dtype=np.intp)
+    _MOVE_CO = np.array([move[1] for move in CUBIE_MOVES], dtype=np.uint8)
+    _MOVE_EP = np.array([move[2] for move in CUBIE_MOVES], dtype=np.intp)
+    _MOVE_EO = np.array([move[3] for move in CUBIE_MOVES], dtype=np.uint8)
+    # ALLOWED_TABLE[last_move, :ALLOWED_COUNT[last_move]] is ALLOWED_NEXT[last_move].
+    ALLOWED_COUNT = np.array([len(allowed) for allowed in ALLOWED_NEXT], dtype=np.uint64)
+    ALLOWED_TABLE = np.zeros((len(ALLOWED_NEXT), len(MOVES)), dtype=np.uint8)
+    for _last_move, _allowed in enumerate(ALLOWED_NEXT):
+        ALLOWED_TABLE[_last_move, :len(_allowed)] = _allowed
+
+def batch_rng(seed, index):
+    """The generator of batch index of the corpus with the given seed."""
+    return random.Random(f"{seed}:{index}")
+
+# --- Random states ---
+
+def _accept(data):
+    """The packed codes among random STATE_BYTES-byte records: masked, and kept when below N_STATES."""
+    if np is not None:
+        records = np.frombuffer(data, dtype=np.uint8).reshape(-1, STATE_BYTES).copy()
+        records[:, 0] &= _FIRST_BYTE_MASK
+        high = records[:, 0]
+        low = records[:, 1:].copy().view('>u8').ravel()
+        keep = (high < _N_HIGH) | ((high == _N_HIGH) & (low < _N_LOW))
+        return records[keep].tobytes()
+    accepted = bytearray()
+    for offset in range(0, len(data), STATE_BYTES):
+        record = bytes((data[offset] & _FIRST_BYTE_MASK,)) + data[offset + 1:offset + STATE_BYTES]
+        if int.from_bytes(record, 'big') < N_STATES:
+            accepted += record
+    return bytes(accepted)
+
+def random_state_codes(rng, count):
+    """count uniformly random states as packed codes (count * STATE_BYTES bytes)."""
+    codes = bytearray()
+    while len(codes) < count * STATE_BYTES:
+        need = count - len(codes) // STATE_BYTES
+        # About 58% of the records are below N_STATES, so one draw is nearly always enough.
+        codes += _accept(rng.randbytes((2 * need + 16) * STATE_BYTES))
+    return bytes(codes[:count * STATE_BYTES])
+
+# --- Random scrambles ---
+
+def _choices(rng, count):
+    """count random 32-bit integers; u * n >> 32 is then a choice among n (bias below 2 ** -27)."""
+    return rng.randbytes(4 * count)
+
+def random_scrambles(rng, count, depth):
+    """
+    count scrambles of depth random canonical moves.
+    Returns (packed codes, move ids): count * STATE_BYTES bytes and count * depth bytes,
+    the moves of scramble i at [i * depth:(i + 1) * depth].
+    """
+    if np is not None:
+        return _random_scrambles_numpy(rng, count, depth)
+    move_ids = bytearray(count * depth)
+    last_moves = [START_MOVE] * count
+    for step in range(depth):
+        choices = _choices(rng, count)
+        for i in range(count):
+            allowed = ALLOWED_NEXT[last_moves[i]]
+            u = int.from_bytes(choices[4 * i:4 * i + 4], 'little')
+            last_moves[i] = move_ids[i * depth + step] = allowed[u * len(allowed) >> 32]
+    codes = bytearray()
+    for i in range(count):
+        cp, co, ep, eo = SOLVED_CUBIES
+        for move_id in move_ids[i * depth:(i + 1) * depth]:
+            move_cp, move_co, move_ep, move_eo = CUBIE_MOVES[move_id]
+            cp, co = [cp[j] for j in move_cp], [(co[j] + o) % 3 for j, o in zip(move_cp, move_co)]
+            ep, eo = [ep[j] for j in move_ep], [(eo[j] + o) % 2 for j, o in zip(move_ep, move_eo)]
+        codes += pack_state(encode_cubies(cp, co, ep, eo))
+    return bytes(codes), bytes(move_ids)
+
+def _random_scrambles_numpy(rng, count, depth):
+    cp = np.tile(np.arange(8, dtype=np.uint8), (count, 1))
+    co = np.zeros((count, 8), dtype=np.uint8)
+    ep = np.tile(np.arange(12, dtype=np.uint8), (count, 1))
+    eo = np.zeros((count, 12), dtype=np.uint8)
+    move_ids = np.zeros((count, depth), dtype=np.uint8)
+    last_moves = np.full(count, START_MOVE, dtype=np.intp)
+    for step in range(depth):
+        choices = np.frombuffer(_choices(rng, count), dtype='<u4').astype(np.uint64)
+        moves = ALLOWED_TABLE[last_moves, (choices * ALLOWED_COUNT[last_moves]) >> np.uint64(32)]
+        move_ids[:, step] = moves
+        last_moves = moves.astype(np.intp)
+        corners, edges = _MOVE_CP[moves], _MOVE_EP[moves]
+        cp = np.take_along_axis(cp, corners, axis=1)
+        co = (np.take_along_axis(co, corners, axis=1) + _MOVE_CO[moves]) % 3
+        ep = np.take_along_axis(ep, edges, axis=1)
+        eo = (np.take_along_axis(eo, edges, axis=1) + _MOVE_EO[moves]) % 2
+    return cubie_codes(cp, co, ep, eo), move_ids.tobytes()
+
+# --- Corpus ---
+
+def _batch(seed, index, count, depth):
+    """(packed codes, move ids or None) of one batch of the corpus."""
+    rng = batch_rng(seed, index)
+    if depth is None:
+        return random_state_codes(rng, count), None
+    return random_scrambles(rng, count, depth)
+
+def generate(count, depth=None, seed=0, batch_size=DEFAULT_BATCH, workers=0):
+    """
+    Yield the corpus batch by batch, in order, as (packed codes, move ids or None).
+    depth: None for uniformly random states, else the scramble depth.
+    workers: processes to spread the batches over (0 generates in this process,
+    None uses one per core); the output is the same either way.
+    """
+    sizes = [min(batch_size, count - start) for start in range(0, count, batch_size)]
+    if workers == 0:
+        for index, size in enumerate(sizes):
+            yield _batch(seed, index, size, depth)
+        return
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        yield from pool.map(_batch, [seed] * len(sizes), range(len(sizes)), sizes, [depth] * len(sizes))
+
+def write_corpus(path, count, depth=None, seed=0, output_format='binary', batch_size=DEFAULT_BATCH, workers=0):
+    """Generate a corpus (see generate) and stream it to path in one of FORMATS; returns the record count."""
+    if output_format not in FORMATS:
+        raise ValueError(f"Unknown format: {output_format}")
+    if output_format == 'scramble' and depth is None:
+        raise ValueError("The scramble format needs scrambles (a depth)")
+    batches = generate(count, depth, seed, batch_size, workers)
+    if output_format == 'binary':
+        with CubeFileWriter(path, with_moves=depth is not None) as writer:
+            for codes, move_ids in batches:
+                for i in range(len(codes) // STATE_BYTES):
+                    code = int.from_bytes(codes[i * STATE_BYTES:(i + 1) * STATE_BYTES], 'big')
+                    writer.write_code(code, () if move_ids is None else move_ids[i * depth:(i + 1) * depth])
+        return count
+    solved_line = Cube().print_cube()
+    with open(path, 'w') as out:
+        for codes, move_ids in batches:
+            lines = []
+            for i in range(len(codes) // STATE_BYTES):
+                if output_format == 'text':
+                    code = int.from_bytes(codes[i * STATE_BYTES:(i + 1) * STATE_BYTES], 'big')
+                    lines.append(buffer_to_cube(decode_state(code)).print_cube())
+                else:
+                    lines.append(solved_line)
+                    lines.extend(' '.join(MOVES[move_id]) for move_id in move_ids[i * depth:(i + 1) * depth])
+            if lines:
+                out.write('\n'.join(lines) + '\n')
+    return count
+
+# --- Main function ---
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Generate a seeded corpus of random cube states or scrambles.")
+    parser.add_argument('out', help="output file")
+    parser.add_argument('--count', type=int, default=1000)
+    parser.add_argument('--depth', type=int, default=None, help="scramble depth (default: uniformly random states)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--format', choices=FORMATS, default='binary')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH, help="records per batch")
+    parser.add_argument('--workers', type=int, default=0, help="worker processes (0: none, default)")
+    args = parser.parse_args()
+
+    write_corpus(args.out, args.count, args.depth, args.seed, args.format, args.batch_size, args.workers)
@@ -0,0 +1,210 @@
+"""
+Binary files of cube states and move sequences.
+
+Layout (little-endian):
+
+    header      magic b'RCSF', version (uint16), flags (uint16), record count (uint64)
+    states      count fixed-size records of cubie.STATE_BYTES bytes (the state code)
+    offsets     count + 1 uint64 offsets into the move bytes    (only with FLAG_MOVES)
+    moves       one byte per move, the move index of partB.MOVES (only with FLAG_MOVES)
+
+Record i is found without reading the others, and CubeFile maps the file with
+mmap, so batch workers can each take a slice of one file without parsing it.
+The colour scheme is not stored: decoded states are coloured like Cube().
+"""
+import mmap
+import shutil
+import struct
+import sys
+import tempfile
+from array import array
+
+from cubie import STATE_BYTES, decode_state, encode_cubies, pack_state, unpack_state, validate_buffer
+from partB import MOVE_IDS, MOVES, Cube, buffer_to_cube, checked_buffer, parse_cube_state
+
+_HEADER = struct.Struct('<4sHHQ')
+_MAGIC = b'RCSF'
+_VERSION = 1
+FLAG_MOVES = 1
+
+class CubeFileWriter:
+    """
+    Append records to a new file. The count is patched into the header by close(),
+    so the number of records does not need to be known in advance.
+    """
+
+    def __init__(self, path, with_moves=True):
+        self.path = path
+        self.with_moves = with_moves
+        self.count = 0
+        self.file = open(path, 'wb')
+        self.file.write(_HEADER.pack(_MAGIC, _VERSION, 0, 0))
+        self.offsets = array('Q', [0])
+        self.moves = tempfile.TemporaryFile() if with_moves else None
+
+    def write(self, buffer, move_ids=()):
+        """
+        Add one record: a 54-sticker buffer and, if the file has moves, a sequence of move indices.
+        The state code cannot hold an unsolvable state, so the buffer is checked first
+        (cubie.validate_buffer raises InvalidCubeError).
+        """
+        self.write_code(encode_cubies(*validate_buffer(buffer)), move_ids)
+
+    def write_code(self, code, move_ids=()):
+        self.file.write(pack_state(code))
+        if self.with_moves:
+            move_bytes = bytes(move_ids)
+            self.moves.write(move_bytes)
+            self.offsets.append(self.offsets[-1] + len(move_bytes))
+        elif move_ids:
+            raise ValueError("This file was opened without move sequences")
+        self.count += 1
+
+    def close(self):
+        if self.file.closed:
+            return
+        flags = 0
+        if self.with_moves:
+            flags |= FLAG_MOVES
+            offsets = array('Q', self.offsets)
+            if sys.byteorder != 'little':
+                offsets.byteswap()
+            self.file.write(offsets.tobytes())
+            self.moves.seek(0)
+            shutil.copyfileobj(self.moves, self.file)
+            self.moves.close()
+        self.file.seek(0)
+        self.file.write(_HEADER.pack(_MAGIC, _VERSION, flags, self.count))
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class CubeFile:
+    """Read-only, memory-mapped view of a file written by CubeFileWriter."""
+
+    def __init__(self, path):
+        with open(path, 'rb') as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._mmap) < _HEADER.size:
+            raise ValueError(f"{path} is too short to be a cube file")
+        magic, version, self.flags, self.count = _HEADER.unpack_from(self._mmap)
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError(f"{path} is not a version {_VERSION} cube file")
+        self._view = memoryview(self._mmap)
+        self._states_offset = _HEADER.size
+        end = self._states_offset + self.count * STATE_BYTES
+        self.offsets = None
+        if self.flags & FLAG_MOVES:
+            offsets = self._view[end:end + 8 * (self.count + 1)]
+            if sys.byteorder == 'little':
+                self.offsets = offsets.cast('Q')
+            else:
+                self.offsets = array('Q', offsets.tobytes())
+                self.offsets.byteswap()
+            end += 8 * (self.count + 1)
+            self._moves_offset = end
+            end += self.offsets[-1]
+        if len(self._mmap) != end:
+            raise ValueError(f"{path} is truncated or has trailing data")
+
+    @property
+    def has_moves(self):
+        return self.offsets is not None
+
+    def __len__(self):
+        return self.count
+
+    def _check(self, index):
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError("cube file record index out of range")
+        return index
+
+    def code(self, index):
+        """State code of record index."""
+        index = self._check(index)
+        start = self._states_offset + index * STATE_BYTES
+        return unpack_state(self._view[start:start + STATE_BYTES])
+
+    def state(self, index):
+        """54-sticker buffer of record index."""
+        return decode_state(self.code(index))
+
+    def moves(self, index):
+        """Move indices (see partB.MOVES) of record index."""
+        index = self._check(index)
+        if not self.has_moves:
+            return []
+        start = self._moves_offset + self.offsets[index]
+        return list(self._view[start:self._moves_offset + self.offsets[index + 1]])
+
+    def __getitem__(self, index):
+        """(state buffer, move indices) of one record, or a list of them for a slice."""
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self.count))]
+        return self.state(index), self.moves(index)
+
+    def __iter__(self):
+        for index in range(self.count):
+            yield self[index]
+
+    def close(self):
+        if self.offsets is not None and not isinstance(self.offsets, array):
+            self.offsets.release()
+        self._view.release()
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+# --- Text conversion ---
+
+def read_text_records(lines):
+    """
+    Parse text records: a state line (as written by Cube.print_cube) followed by
+    zero or more 'face direction' move lines. Yields (sticker buffer, move indices).
+    """
+    buffer, move_ids = None, []
+    for line_number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        if ':' in line:
+            if buffer is not None:
+                yield buffer, move_ids
+            try:
+                buffer, move_ids = checked_buffer(Cube(state=parse_cube_state(line))), []
+            except ValueError as e:
+                raise ValueError(f"Invalid cube state in line {line_number}: {e}") from e
+            continue
+        move = tuple(line.split())
+        if buffer is None or move not in MOVE_IDS:
+            raise ValueError(f"Invalid move format in line {line_number}: '{line}'")
+        move_ids.append(MOVE_IDS[move])
+    if buffer is not None:
+        yield buffer, move_ids
+
+def text_to_binary(text_path, binary_path, with_moves=True):
+    """Convert a text file of records to the binary format; returns the record count."""
+    with open(text_path, 'r') as source, CubeFileWriter(binary_path, with_moves) as writer:
+        for buffer, move_ids in read_text_records(source):
+            writer.write(buffer, move_ids if with_moves else ())
+        return writer.count
+
+def binary_to_text(binary_path, text_path):
+    """Write the records of a binary file back in the text format; returns the record count."""
+    with CubeFile(binary_path) as cubes, open(text_path, 'w') as out:
+        for buffer, move_ids in cubes:
+            out.write(buffer_to_cube(buffer).print_cube() + "\n")
+            for move_id in move_ids:
+                face, direction = MOVES[move_id]
+                out.write(f"{face} {direction}\n")
+        return len(cubes)
@@ -0,0 +1,235 @@
+"""
+Cubie-level view of the 54-sticker buffers used by the move engine in partB.
+
+A buffer is read as 8 corners and 12 edges, each with a permutation and an
+orientation, and packed into a single integer (the state code) that fits in
+STATE_BYTES bytes. The code is what the compact visited sets, tables and files
+store instead of the stickers themselves.
+"""
+from operator import itemgetter
+
+# Centre colours of Cube() in print order (T, F, R, A, L, B).
+FACE_COLORS = b'WGRBOY'
+CENTER_FACELETS = (4, 13, 22, 31, 40, 49)
+
+# Corner positions, named by their faces. The first facelet of each corner is on
+# T or B (the orientation reference); the other two follow in a fixed rotational order.
+CORNER_NAMES = ['TRF', 'TFL', 'TLA', 'TAR', 'BFR', 'BLF', 'BAL', 'BRA']
+CORNER_FACELETS = [(8, 18, 11), (6, 9, 38), (0, 36, 29), (2, 27, 20),
+                   (47, 17, 24), (45, 44, 15), (51, 35, 42), (53, 26, 33)]
+
+# Edge positions. The first facelet is on T or B, or on F or A for the middle layer.
+EDGE_NAMES = ['TR', 'TF', 'TL', 'TA', 'BR', 'BF', 'BL', 'BA', 'FR', 'FL', 'AL', 'AR']
+EDGE_FACELETS = [(5, 19), (7, 10), (3, 37), (1, 28), (50, 25), (46, 16),
+                 (48, 43), (52, 34), (14, 21), (12, 41), (32, 39), (30, 23)]
+
+# Coordinate sizes.
+N_CORNER_PERM = 40320       # 8!
+N_CORNER_ORI = 2187         # 3^7, the last twist follows from the others
+N_EDGE_PERM_HALF = 239500800  # 12! / 2, the edge parity follows from the corners
+N_EDGE_ORI = 2048           # 2^11, the last flip follows from the others
+N_STATES = N_CORNER_PERM * N_CORNER_ORI * N_EDGE_PERM_HALF * N_EDGE_ORI
+STATE_BYTES = (N_STATES.bit_length() + 7) // 8  # 9
+
+SOLVED_CUBIES = (list(range(8)), [0] * 8, list(range(12)), [0] * 12)
+
+class InvalidCubeError(ValueError):
+    """A sticker buffer that is not a cube state reachable from solved (see validate_buffer)."""
+
+def _face_index(facelet):
+    return facelet // 9
+
+# Reading (face of each facelet, in position order) -> cubie, and -> orientation.
+_CORNER_CUBIE, _CORNER_ORI = {}, {}
+for _cubie, _facelets in enumerate(CORNER_FACELETS):
+    _a, _b, _c = (_face_index(f) for f in _facelets)
+    for _ori, _reading in enumerate([(_a, _b, _c), (_c, _a, _b), (_b, _c, _a)]):
+        _CORNER_CUBIE[_reading] = _cubie
+        _CORNER_ORI[_reading] = _ori
+_EDGE_CUBIE, _EDGE_ORI = {}, {}
+for _cubie, _facelets in enumerate(EDGE_FACELETS):
+    _a, _b = (_face_index(f) for f in _facelets)
+    for _ori, _reading in enumerate([(_a, _b), (_b, _a)]):
+        _EDGE_CUBIE[_reading] = _cubie
+        _EDGE_ORI[_reading] = _ori
+
+_CORNER_GETTER = itemgetter(*[f for facelets in CORNER_FACELETS for f in facelets])
+_EDGE_GETTER = itemgetter(*[f for facelets in EDGE_FACELETS for f in facelets])
+_TRANSLATIONS = {}
+
+def face_labels(buffer):
+    """
+    Replace every sticker by the index of the face whose centre has its colour.
+    This makes the cubie view independent of the colour scheme of the input.
+    """
+    centres = bytes(buffer[i] for i in CENTER_FACELETS)
+    table = _TRANSLATIONS.get(centres)
+    if table is None:
+        if len(set(centres)) != 6:
+            raise InvalidCubeError(f"Centre stickers must have six different colours, got: {centres.decode('ascii')}")
+        table = _TRANSLATIONS[centres] = bytes.maketrans(centres, bytes(range(6)))
+    return buffer.translate(table)
+
+def facelets_to_cubies(buffer):
+    """
+    Read a 54-sticker buffer as (corner perm, corner ori, edge perm, edge ori) lists.
+    cp[i] is the corner sitting at position i and co[i] its twist; same for edges.
+    """
+    labels = face_labels(buffer)
+    corners = _CORNER_GETTER(labels)
+    corners = list(zip(corners[0::3], corners[1::3], corners[2::3]))
+    edges = _EDGE_GETTER(labels)
+    edges = list(zip(edges[0::2], edges[1::2]))
+    cp = list(map(_CORNER_CUBIE.get, corners))
+    ep = list(map(_EDGE_CUBIE.get, edges))
+    if None in cp:
+        raise InvalidCubeError(f"Stickers at corner {CORNER_NAMES[cp.index(None)]} do not form a cube corner")
+    if None in ep:
+        raise InvalidCubeError(f"Stickers at edge {EDGE_NAMES[ep.index(None)]} do not form a cube edge")
+    co = list(map(_CORNER_ORI.__getitem__, corners))
+    eo = list(map(_EDGE_ORI.__getitem__, edges))
+    if len(set(cp)) != 8 or len(set(ep)) != 12:
+        raise InvalidCubeError("Some corner or edge appears more than once on the cube")
+    return cp, co, ep, eo
+
+def cubies_to_facelets(cp, co, ep, eo, colors=FACE_COLORS):
+    """Build the 54-sticker buffer (coloured like Cube()) for a cubie state."""
+    stickers = bytearray(colors[i // 9] for i in range(54))
+    for position, facelets in enumerate(CORNER_FACELETS):
+        cubie_facelets = CORNER_FACELETS[cp[position]]
+        for k in range(3):
+            stickers[facelets[(k + co[position]) % 3]] = colors[_face_index(cubie_facelets[k])]
+    for position, facelets in enumerate(EDGE_FACELETS):
+        cubie_facelets = EDGE_FACELETS[ep[position]]
+        for k in range(2):
+            stickers[facelets[(k + eo[position]) % 2]] = colors[_face_index(cubie_facelets[k])]
+    return bytes(stickers)
+
+# --- Permutation ranks ---
+
+def permutation_rank(perm):
+    """Lexicographic rank (Lehmer code) of a permutation of range(len(perm))."""
+    remaining = list(range(len(perm)))
+    rank = 0
+    for i, piece in enumerate(perm):
+        index = remaining.index(piece)
+        del remaining[index]
+        rank = rank * (len(perm) - i) + index
+    return rank
+
+def permutation_unrank(rank, n):
+    """Inverse of permutation_rank."""
+    digits = []
+    for radix in range(1, n + 1):
+        rank, digit = divmod(rank, radix)
+        digits.append(digit)
+    remaining = list(range(n))
+    return [remaining.pop(digit) for digit in reversed(digits)]
+
+def permutation_parity(perm):
+    """0 for an even permutation, 1 for an odd one."""
+    seen = [False] * len(perm)
+    parity = 0
+    for start in range(len(perm)):
+        if seen[start]:
+            continue
+        length = 0
+        i = start
+        while not seen[i]:
+            seen[i] = True
+            i = perm[i]
+            length += 1
+        parity ^= (length - 1) & 1
+    return parity
+
+# --- Validation ---
+
+def validate_cubies(cp, co, ep, eo):
+    """
+    Check the three invariants every move preserves: the corner twists sum to 0
+    mod 3, the edge flips to 0 mod 2, and the corner and edge permutations have
+    the same parity. Raises InvalidCubeError naming the one that fails.
+    """
+    twist = sum(co) % 3
+    if twist:
+        raise InvalidCubeError(f"Corner twists sum to {twist} mod 3: a corner is twisted in place")
+    if sum(eo) % 2:
+        raise InvalidCubeError("Edge flips sum to 1 mod 2: an edge is flipped in place")
+    if permutation_parity(cp) != permutation_parity(ep):
+        raise InvalidCubeError("Corner and edge permutations have different parity: two pieces are swapped")
+
+def validate_buffer(buffer):
+    """
+    Check that a 54-sticker buffer is a state the solvers can solve: six colours
+    of nine stickers each, the centres of Cube() (centres never move, and the
+    sticker solvers search for SOLVED_BUFFER), stickers that form the 8 corners
+    and 12 edges of a cube, and the invariants of validate_cubies. Takes a few
+    microseconds, against a search that would run through the whole reachable
+    group before giving up. Returns the cubies; raises InvalidCubeError.
+    """
+    if len(buffer) != 54:
+        raise InvalidCubeError(f"Expected 54 stickers, got {len(buffer)}")
+    colors = set(buffer)
+    if len(colors) != 6:
+        names = ''.join(sorted(chr(color) for color in colors))
+        raise InvalidCubeError(f"Expected 6 colours, got {len(colors)}: {names}")
+    for color in sorted(colors):
+        count = buffer.count(color)
+        if count != 9:
+            raise InvalidCubeError(f"Colour {chr(color)} appears on {count} stickers, expected 9")
+    for face, facelet, color in zip('TFRALB', CENTER_FACELETS, FACE_COLORS):
+        if buffer[facelet] != color:
+            raise InvalidCubeError(f"Centre of face {face} is {chr(buffer[facelet])}, expected {chr(color)}: "
+                                   f"the centres must be those of Cube() ({FACE_COLORS.decode('ascii')} "
+                                   f"on T F R A L B)")
+    cubies = facelets_to_cubies(buffer)
+    validate_cubies(*cubies)
+    return cubies
+
+# --- State codes ---
+
+_DIGITS = bytes.maketrans(bytes(range(3)), b'012')
+
+def encode_cubies(cp, co, ep, eo):
+    """Pack a cubie state into an integer in range(N_STATES)."""
+    corner_ori = int(bytes(co[:7]).translate(_DIGITS), 3)
+    edge_ori = int(bytes(eo[:11]).translate(_DIGITS), 2)
+    code = permutation_rank(cp) * N_CORNER_ORI + corner_ori
+    # Swapping the last two edges changes only the lowest Lehmer digit, so the
+    # two ranks of a pair differ in parity and half the rank is enough.
+    code = code * N_EDGE_PERM_HALF + permutation_rank(ep) // 2
+    return code * N_EDGE_ORI + edge_ori
+
+def decode_cubies(code):
+    """Inverse of encode_cubies."""
+    code, edge_ori = divmod(code, N_EDGE_ORI)
+    code, edge_half = divmod(code, N_EDGE_PERM_HALF)
+    corner_rank, corner_ori = divmod(code, N_CORNER_ORI)
+    cp = permutation_unrank(corner_rank, 8)
+    ep = permutation_unrank(edge_half * 2, 12)
+    if permutation_parity(ep) != permutation_parity(cp):
+        ep[10], ep[11] = ep[11], ep[10]
+    co = [0] * 8
+    for i in range(6, -1, -1):
+        corner_ori, co[i] = divmod(corner_ori, 3)
+    co[7] = -sum(co) % 3
+    eo = [0] * 12
+    for i in range(10, -1, -1):
+        edge_ori, eo[i] = divmod(edge_ori, 2)
+    eo[11] = sum(eo) % 2
+    return cp, co, ep, eo
+
+def encode_state(buffer):
+    """Compact integer code of a 54-sticker buffer (see STATE_BYTES)."""
+    return encode_cubies(*facelets_to_cubies(buffer))
+
+def decode_state(code):
+    """54-sticker buffer, coloured like Cube(), for a state code."""
+    return cubies_to_facelets(*decode_cubies(code))
+
+def pack_state(code):
+    """State code as STATE_BYTES big-endian bytes; byte order matches numeric order."""
+    return code.to_bytes(STATE_BYTES, 'big')
+
+def unpack_state(data):
+    return int.from_bytes(data, 'big')
@@ -0,0 +1,388 @@
+"""
+Resident solver service.
+
+    python daemon.py [--socket /tmp/cube.sock | --port 8765] [--solver two-phase] [--workers 4]
+                     [--deadline 5] [--batch-size 16] [--batch-window 0.002] [--cache cache.log]
+
+The server is started once: its worker processes load the solver's tables when
+they start (see batch.py), and a SolutionCache (see solution_cache.py) lives in
+the server process, so a request costs a socket round trip, a cache lookup and,
+on a miss, one solve in a warm worker.
+
+Every request is one line: a state line in the cube_problem.txt format
+(T:... F:... R:... A:... L:... B:...), optionally followed on the same line by
+moves as face/direction pairs, which are applied before solving, e.g.
+
+    T:WWWWWWWWW F:GGGGGGGGG R:RRRRRRRRR A:BBBBBBBBB L:OOOOOOOOO B:YYYYYYYYY F C T A
+
+Every request gets one reply line, in request order on each connection, in the
+format of batch.format_result without the index: "solved F C T A", "invalid ...",
+"unsolved", "limit ...", "timeout ...", "error ..." (a worker failed) or "busy"
+(the server already has max_pending requests and did not queue this one).
+
+Requests that miss the cache wait in a queue. Once a worker is free, the
+dispatcher shares what has arrived among the free workers: one request each
+while workers are idle, batches of up to batch_size requests (one task, one
+round trip through the pool) when the queue outgrows them. Workers send every
+result back on a queue as soon as it is solved, not at the end of its batch.
+Each request has a wall-clock deadline set at its arrival; a request still
+queued at its deadline is answered without reaching a worker, and a solve gets
+only the time its request has left (see partB.SearchLimits), so a worker stops
+working on a request once it has timed out. Solutions that arrive late still
+go into the cache. Identical states requested while one is being solved wait
+for that solve instead of queueing another. If a worker dies, the requests it
+held are answered "error" and the pool is replaced.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from batch import SOLVERS, BatchResult, _init_worker, _solve_task, format_result
+from partB import MOVE_IDS, MOVES, Cube, apply_moves, buffer_to_cube, checked_buffer, parse_cube_state
+from solution_cache import SolutionCache
+
+DEFAULT_DEADLINE = 5.0      # seconds per request
+DEFAULT_BATCH_SIZE = 16     # requests per worker task
+DEFAULT_BATCH_WINDOW = 0.002  # seconds the dispatcher waits to fill a batch
+DEFAULT_MAX_PENDING = 1024  # requests queued or being solved
+
+def parse_request(line):
+    """
+    The sticker buffer a request line asks to solve: its state with its moves
+    applied. Raises ValueError (cubie.InvalidCubeError for unsolvable states).
+    """
+    tokens = line.split()
+    state_tokens = [token for token in tokens if ':' in token]
+    move_tokens = [token for token in tokens if ':' not in token]
+    if len(move_tokens) % 2:
+        raise ValueError(f"Moves must be face/direction pairs, got: {' '.join(move_tokens)}")
+    move_ids = []
+    for face, direction in zip(move_tokens[::2], move_tokens[1::2]):
+        if (face, direction) not in MOVE_IDS:
+            raise ValueError(f"Invalid move: '{face} {direction}'")
+        move_ids.append(MOVE_IDS[(face, direction)])
+    buffer = checked_buffer(Cube(state=parse_cube_state(' '.join(state_tokens))))
+    return apply_moves(buffer, move_ids)
+
+_results = None
+
+def _init_daemon_worker(solver_name, endgame, results):
+    """Pool initializer: the solver as for batch.py, plus the queue results are sent back on."""
+    global _results
+    _results = results
+    _init_worker(solver_name, endgame)
+
+def _solve_many(tasks, limits):
+    """
+    Worker side of a batch: (index, state line, deadline) tasks, solved one after
+    another. deadline is a time.time() value, so every task gets only the time
+    its request has left; each result is put on the results queue as soon as it
+    is ready. Returns the number of tasks.
+    """
+    for index, line, deadline in tasks:
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            result = BatchResult(index, line, 'timeout', None, "deadline passed before the solve started", 0.0)
+        else:
+            result = _solve_task(index, line, None, (*limits[:2], remaining, None, limits[4]))
+            if result.status == 'limit' and result.error.startswith('deadline'):
+                result = result._replace(status='timeout')
+        _results.put(result)
+    return len(tasks)
+
+class SolverDaemon:
+    """
+    Cache, request queue and worker pool behind the socket server.
+    solver / endgame / max_states / max_bytes / fallback: as for batch.solve_batch.
+    deadline: seconds a request may take from its arrival.
+    batch_size / batch_window: the most requests sent to one worker together, and
+    how long the dispatcher waits for more once it has one.
+    max_pending: requests queued or being solved before new ones are answered "busy".
+    cache: the SolutionCache to answer from and fill (default: an in-memory one).
+    """
+
+    def __init__(self, solver='two-phase', workers=None, deadline=DEFAULT_DEADLINE,
+                 batch_size=DEFAULT_BATCH_SIZE, batch_window=DEFAULT_BATCH_WINDOW,
+                 max_pending=DEFAULT_MAX_PENDING, cache=None, endgame=False,
+                 max_states=None, max_bytes=None, fallback=False):
+        if solver not in SOLVERS:
+            raise ValueError(f"Unknown solver: {solver}")
+        self.solver = solver
+        self.workers = workers or os.cpu_count() or 1
+        self.deadline = deadline
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self.max_pending = max_pending
+        self.cache = cache if cache is not None else SolutionCache()
+        self.endgame = endgame
+        self.limits = (max_states, max_bytes, None, None, fallback)
+        self.pending = 0
+        self.served = 0
+        self.rejected = 0
+        self._pool = None
+        self._queue = None
+        self._dispatcher = None
+        self._results = None
+        self._reader = None
+        self._loop = None
+        self._free = 0
+        self._worker_freed = None
+        # index -> (future, buffer) of every request sent to the workers and not answered by them yet.
+        self._requests = {}
+        # buffer -> future of the solve in flight for that state, shared by identical requests.
+        self._inflight = {}
+        self._next_index = 0
+
+    # --- Lifecycle ---
+
+    async def start(self):
+        """Start the workers (they load their tables now), the result reader and the dispatcher."""
+        self._loop = asyncio.get_running_loop()
+        self._results = multiprocessing.Queue()
+        self._pool = self._new_pool()
+        # Submitting one no-op task per worker makes the pool spawn all of them up front.
+        await asyncio.gather(*(self._loop.run_in_executor(self._pool, _solve_many, [], self.limits)
+                               for _ in range(self.workers)))
+        self._reader = threading.Thread(target=self._read_results, daemon=True)
+        self._reader.start()
+        self._queue = asyncio.Queue()
+        self._free = self.workers
+        self._worker_freed = asyncio.Event()
+        self._dispatcher = asyncio.create_task(self._dispatch())
+
+    def _new_pool(self):
+        return ProcessPoolExecutor(max_workers=self.workers, initializer=_init_daemon_worker,
+                                   initargs=(self.solver, self.endgame, self._results))
+
+    def _replace_pool(self):
+        """A worker died and broke the pool: every job in it has failed, so start a new one."""
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        self._pool = self._new_pool()
+
+    async def close(self):
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            try:
+                await self._dispatcher
+            except asyncio.CancelledError:
+                pass
+            self._dispatcher = None
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+        if self._reader is not None:
+            self._results.put(None)
+            self._reader.join()
+            self._reader = None
+        self.cache.close()
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    # --- Requests ---
+
+    async def solve(self, line):
+        """Answer one request line with a BatchResult (its index counts requests since start)."""
+        start = time.perf_counter()
+        index = self._next_index = self._next_index + 1
+        try:
+            buffer = parse_request(line)
+        except ValueError as e:
+            return BatchResult(index, line, 'invalid', None, str(e), time.perf_counter() - start)
+        move_ids = self.cache.get(buffer)
+        if move_ids is not None:
+            self.served += 1
+            return BatchResult(index, line, 'solved', [MOVES[move_id] for move_id in move_ids], None,
+                               time.perf_counter() - start)
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            return BatchResult(index, line, 'busy', None, None, time.perf_counter() - start)
+        self.pending += 1
+        deadline = time.time() + self.deadline
+        try:
+            while True:
+                future = self._inflight.get(buffer)
+                if future is None:
+                    future = self._submit(index, buffer, deadline)
+                # The future is shared, so a waiter that times out must not cancel it.
+                # The worker stops at the deadline; the grace period covers the trip back.
+                result = await asyncio.wait_for(asyncio.shield(future), deadline - time.time() + 1.0)
+                if result.status != 'timeout' or time.time() >= deadline:
+                    break
+                # The shared solve ran out of an earlier identical request's time, not this one's.
+        except asyncio.TimeoutError:
+            result = BatchResult(index, line, 'timeout', None, f"no solution within {self.deadline}s", 0.0)
+        finally:
+            self.pending -= 1
+        self.served += 1
+        return result._replace(index=index, line=line, seconds=time.perf_counter() - start)
+
+    def _submit(self, index, buffer, deadline):
+        """Queue a solve of buffer for the dispatcher; its future is shared until it is done."""
+        future = self._loop.create_future()
+        self._requests[index] = (future, buffer)
+        self._inflight[buffer] = future
+        future.add_done_callback(lambda future: self._inflight.pop(buffer, None)
+                                 if self._inflight.get(buffer) is future else None)
+        self._queue.put_nowait((index, buffer, deadline))
+        return future
+
+    def _read_results(self):
+        """Reader thread: hand every result from the workers to the event loop as it arrives."""
+        while True:
+            result = self._results.get()
+            if result is None:
+                return
+            self._loop.call_soon_threadsafe(self._resolve, result)
+
+    def _resolve(self, result):
+        future, buffer = self._requests.pop(result.index, (None, None))
+        # A solve that finished after its request timed out still fills the cache.
+        if buffer is not None and result.status == 'solved':
+            self.cache.put(buffer, [MOVE_IDS[move] for move in result.moves])
+        if future is not None and not future.done():
+            future.set_result(result)
+
+    async def _dispatch(self):
+        """
+        Send queued requests to free workers. With n requests waiting and k free
+        workers, a worker gets ceil(n / k) of them (at most batch_size), so no
+        request waits behind another while a worker is idle.
+        """
+        waiting = deque()
+        while True:
+            if not waiting:
+                waiting.append(await self._queue.get())
+                # Give requests arriving together a moment to join.
+                await asyncio.sleep(self.batch_window)
+            while not self._free:
+                self._worker_freed.clear()
+                await self._worker_freed.wait()
+            while not self._queue.empty():
+                waiting.append(self._queue.get_nowait())
+            now = time.time()
+            batch = []
+            size = min(self.batch_size, -(-len(waiting) // self._free))
+            while waiting and len(batch) < size:
+                index, buffer, deadline = waiting.popleft()
+                future, _ = self._requests.get(index, (None, None))
+                if deadline <= now:
+                    self._resolve(BatchResult(index, None, 'timeout', None, "deadline passed in the queue", 0.0))
+                elif future is None or future.done():
+                    self._requests.pop(index, None)
+                else:
+                    batch.append((index, buffer_to_cube(buffer).print_cube(), deadline))
+            if not batch:
+                continue
+            pool = self._pool
+            try:
+                job = pool.submit(_solve_many, batch, self.limits)
+            except BrokenProcessPool as e:
+                self._fail(batch, f"worker pool failed: {e}")
+                self._replace_pool()
+                continue
+            self._free -= 1
+            job.add_done_callback(lambda job, batch=batch, pool=pool:
+                                  self._loop.call_soon_threadsafe(self._batch_done, job, batch, pool))
+
+    def _batch_done(self, job, batch, pool):
+        self._free += 1
+        self._worker_freed.set()
+        if job.cancelled() or job.exception() is not None:
+            self._fail(batch, "cancelled" if job.cancelled() else str(job.exception()))
+            if not job.cancelled() and isinstance(job.exception(), BrokenProcessPool) and pool is self._pool:
+                self._replace_pool()
+
+    def _fail(self, batch, error):
+        """Answer every request of a batch the workers did not answer with an error."""
+        for index, _, _ in batch:
+            if index in self._requests:
+                self._resolve(BatchResult(index, None, 'error', None, error, 0.0))
+
+    def stats(self):
+        return {'served': self.served, 'rejected': self.rejected, 'pending': self.pending,
+                'cache': self.cache.stats()}
+
+    # --- Connections ---
+
+    async def handle_connection(self, reader, writer):
+        """
+        Serve the request lines of one connection. Requests are solved concurrently;
+        replies are written in request order as each one is ready.
+        """
+        replies = asyncio.Queue()
+
+        async def write_replies():
+            while True:
+                reply = await replies.get()
+                if reply is None:
+                    break
+                result = await reply
+                writer.write(format_result(result).split(' ', 1)[1].encode('ascii') + b"\n")
+                await writer.drain()
+
+        writer_task = asyncio.create_task(write_replies())
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                line = line.decode('ascii', 'replace').strip()
+                if line:
+                    replies.put_nowait(asyncio.create_task(self.solve(line)))
+            replies.put_nowait(None)
+            await writer_task
+        except ConnectionError:
+            writer_task.cancel()
+        finally:
+            writer.close()
+
+async def serve(daemon, socket_path=None, host='127.0.0.1', port=8765):
+    """Run the daemon on a Unix socket when socket_path is given, else on host:port, until cancelled."""
+    async with daemon:
+        if socket_path is not None:
+            server = await asyncio.start_unix_server(daemon.handle_connection, path=socket_path)
+        else:
+            server = await asyncio.start_server(daemon.handle_connection, host, port)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            if socket_path is not None and os.path.exists(socket_path):
+                os.remove(socket_path)
+
+# --- Main function ---
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serve cube solves over a local socket.")
+    parser.add_argument('--socket', default=None, help="Unix socket path (default: TCP on --host/--port)")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--solver', choices=sorted(SOLVERS), default='two-phase')
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: one per core)")
+    parser.add_argument('--deadline', type=float, default=DEFAULT_DEADLINE, help="seconds allowed per request")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help="requests per worker task")
+    parser.add_argument('--batch-window', type=float, default=DEFAULT_BATCH_WINDOW,
+                        help="seconds to wait for more requests to batch")
+    parser.add_argument('--max-pending', type=int, default=DEFAULT_MAX_PENDING,
+                        help="requests in flight before new ones are answered busy")
+    parser.add_argument('--cache', default=None, help="solution cache log file (default: in memory only)")
+    parser.add_argument('--cache-entries', type=int, default=100000)
+    parser.add_argument('--endgame', action='store_true', help="look up states near solved in the near-solved table first")
+    args = parser.parse_args()
+
+    daemon = SolverDaemon(args.solver, args.workers, args.deadline, args.batch_size, args.batch_window,
+                          args.max_pending, SolutionCache(args.cache_entries, path=args.cache), args.endgame)
+    try:
+        asyncio.run(serve(daemon, args.socket, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
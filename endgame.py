@@ -0,0 +1,233 @@
+"""
+Table of every state within a few moves of solved.
+
+Each state within `depth` moves is stored as a 10-byte record: its 9-byte state
+code and one byte holding its distance (high 3 bits) and the first move of an
+optimal solution (low 5 bits). Records are sorted by code, so a lookup is a
+binary search over the file, which load() maps with mmap. Following the stored
+moves from state to state gives an optimal solution.
+
+A short scramble is solved by lookups alone, and the searches use the table as
+their goal side: they stop as soon as they reach any state in it instead of the
+solved cube itself.
+
+A symmetric table keeps one record per symmetry class instead (see symmetry.py):
+the code of the class representative, with the first move of the
+representative's own solution. It is built by symmetry.generate_class_table,
+which expands each class once: at depth 5 it is 47 times smaller (13098 records
+against 621649) and about 9 times faster to build, which makes depth 6
+practical. Each lookup costs the 48 conjugations of symmetry.canonical_form,
+though, so plain tables are the better goal side for a search where the lookups
+dominate.
+
+    python endgame.py build [--depth 5] [--symmetric] [--out FILE]
+"""
+import argparse
+import mmap
+import os
+import struct
+import time
+from bisect import bisect_left
+
+from cubie import STATE_BYTES, encode_state, pack_state
+from partB import ALLOWED_NEXT, INVERSE_MOVE, MOVES, SOLVED_BUFFER, START_MOVE, apply_move, checked_buffer
+from pattern_db import DEFAULT_TABLE_DIR
+from symmetry import canonical_code, generate_class_table, table_solution
+from vectorized import layers, state_codes
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+RECORD_BYTES = STATE_BYTES + 1
+DEFAULT_DEPTH = 5
+
+# magic, version, depth, flags, record count
+_HEADER = struct.Struct('<4sHHB7xQ')
+_MAGIC = b'RCNS'
+_VERSION = 1
+_SYMMETRIC = 1  # flag: one record per symmetry class
+
+class _Codes:
+    """Sequence of the state codes in a sorted record buffer, for bisect."""
+
+    def __init__(self, records, count):
+        self.records, self.count = records, count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        offset = index * RECORD_BYTES
+        return bytes(self.records[offset:offset + STATE_BYTES])
+
+class NearSolvedTable:
+    """
+    Sorted records of every state, or with symmetric every symmetry class, within
+    depth moves of solved (see the module docstring).
+    """
+
+    def __init__(self, depth, records, symmetric=False):
+        self.depth = depth
+        self.records = records
+        self.symmetric = symmetric
+        self.count = len(records) // RECORD_BYTES
+        self._codes = _Codes(records, self.count)
+        self._mmap = None
+
+    @classmethod
+    def generate(cls, depth=DEFAULT_DEPTH, symmetric=False):
+        """
+        Breadth-first sweep from the solved cube over the canonical move sequences
+        (with NumPy, by vectorized.layers), or over classes. Where a state has several
+        optimal first moves, which one is stored depends on the sweep.
+        """
+        if depth > 7:
+            raise ValueError(f"Distances up to {depth} do not fit in 3 bits")
+        if symmetric:
+            entries = sorted((pack_state(encode_state(key)), distance << 5 | move_id)
+                             for key, (distance, move_id) in generate_class_table(depth).items())
+            return cls(depth, b''.join(code + bytes((entry,)) for code, entry in entries), symmetric=True)
+        if np is not None:
+            return cls(depth, _layer_records(depth))
+        entries = [(pack_state(encode_state(SOLVED_BUFFER)), 0)]
+        seen = {SOLVED_BUFFER}
+        layer = [(SOLVED_BUFFER, START_MOVE)]
+        for distance in range(1, depth + 1):
+            next_layer = []
+            for state, last_move in layer:
+                for move_id in ALLOWED_NEXT[last_move]:
+                    child = apply_move(state, move_id)
+                    if child not in seen:
+                        seen.add(child)
+                        next_layer.append((child, move_id))
+                        # Undoing the move that reached the child is its first step home.
+                        entries.append((pack_state(encode_state(child)), distance << 5 | INVERSE_MOVE[move_id]))
+            layer = next_layer
+        entries.sort()
+        return cls(depth, b''.join(code + bytes((entry,)) for code, entry in entries))
+
+    def __len__(self):
+        return self.count
+
+    def _find(self, code):
+        """The entry byte of a packed code, or None."""
+        index = bisect_left(self._codes, code)
+        if index < self.count and self._codes[index] == code:
+            return self.records[index * RECORD_BYTES + STATE_BYTES]
+        return None
+
+    def _entry(self, buffer):
+        return self._find(pack_state(canonical_code(buffer) if self.symmetric else encode_state(buffer)))
+
+    def _class_entry(self, key):
+        """(distance, move of the representative) of a canonical key, for symmetry.table_solution."""
+        entry = self._find(pack_state(encode_state(key)))
+        return None if entry is None else (entry >> 5, entry & 31)
+
+    def distance(self, buffer):
+        """Number of moves from the sticker buffer to solved, or None if it is more than depth."""
+        entry = self._entry(buffer)
+        return None if entry is None else entry >> 5
+
+    def solve_buffer(self, buffer):
+        """Optimal move indices that solve the buffer, or None if it is not in the table."""
+        if self.symmetric:
+            return table_solution(self._class_entry, buffer)
+        entry = self._entry(buffer)
+        if entry is None:
+            return None
+        path = []
+        while entry >> 5:
+            move_id = entry & 31
+            path.append(move_id)
+            buffer = apply_move(buffer, move_id)
+            entry = self._entry(buffer)
+        return path
+
+    def solve(self, initial_cube):
+        """Same as solve_buffer for a Cube, with (face, direction) moves."""
+        path = self.solve_buffer(checked_buffer(initial_cube))
+        return None if path is None else [MOVES[move_id] for move_id in path]
+
+    # --- Files ---
+
+    def save(self, path):
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as file:
+            file.write(_HEADER.pack(_MAGIC, _VERSION, self.depth, _SYMMETRIC if self.symmetric else 0, self.count))
+            file.write(self.records)
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as file:
+            mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(mapped) < _HEADER.size:
+            raise ValueError(f"{path} is too short to be a near-solved table")
+        magic, version, depth, flags, count = _HEADER.unpack_from(mapped)
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError(f"{path} is not a version {_VERSION} near-solved table")
+        if len(mapped) != _HEADER.size + count * RECORD_BYTES:
+            raise ValueError(f"{path} is truncated or has trailing data")
+        table = cls(depth, memoryview(mapped)[_HEADER.size:], symmetric=bool(flags & _SYMMETRIC))
+        table._mmap = mapped
+        return table
+
+def _layer_records(depth):
+    """The sorted records of NearSolvedTable.generate, from the NumPy layers of vectorized.layers."""
+    inverse = np.array(INVERSE_MOVE + [0], dtype=np.uint8)  # the root (START_MOVE) has no first move
+    codes, entries = [], []
+    for distance, layer in enumerate(layers(SOLVED_BUFFER, depth)):
+        codes.append(np.frombuffer(state_codes(layer.states), dtype=np.uint8).reshape(-1, STATE_BYTES))
+        entries.append(np.uint8(distance << 5) | inverse[layer.last_moves])
+    codes, entries = np.concatenate(codes), np.concatenate(entries)
+    # Sort by the code as a big-endian number: its first byte, then the other eight.
+    order = np.lexsort((codes[:, 1:].copy().view('>u8').ravel(), codes[:, 0]))
+    return np.concatenate([codes[order], entries[order, None]], axis=1).tobytes()
+
+def default_path(depth=DEFAULT_DEPTH, symmetric=False):
+    return os.path.join(DEFAULT_TABLE_DIR, f"near_solved_{depth}{'_sym' if symmetric else ''}.tbl")
+
+_default_cache = {}
+
+def default_table(depth=DEFAULT_DEPTH, symmetric=False):
+    """The table of the given depth, mapped from the default directory (or generated), once per process."""
+    table = _default_cache.get((depth, symmetric))
+    if table is None:
+        path = default_path(depth, symmetric)
+        table = (NearSolvedTable.load(path) if os.path.exists(path)
+                 else NearSolvedTable.generate(depth, symmetric))
+        _default_cache[(depth, symmetric)] = table
+    return table
+
+def table_first(solver, table=None):
+    """
+    Wrap a solver entry point so that states in the table are answered by lookup
+    and only the others reach the solver.
+    """
+    def solve(initial_cube, *args, **kwargs):
+        lookup_table = table if table is not None else default_table()
+        solution_moves = lookup_table.solve(initial_cube)
+        if solution_moves is not None:
+            return solution_moves
+        return solver(initial_cube, *args, **kwargs)
+    return solve
+
+# --- Main function ---
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Near-solved lookup table.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build_parser = subparsers.add_parser('build', help="generate the table and write it to disk")
+    build_parser.add_argument('--depth', type=int, default=DEFAULT_DEPTH, help="moves from solved to cover")
+    build_parser.add_argument('--symmetric', action='store_true', help="one record per symmetry class")
+    build_parser.add_argument('--out', default=None, help="output file")
+    args = parser.parse_args()
+
+    start = time.time()
+    out = args.out or default_path(args.depth, args.symmetric)
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    table = NearSolvedTable.generate(args.depth, args.symmetric)
+    table.save(out)
+    print(f"{out}: {len(table)} states, {time.time() - start:.1f}s")
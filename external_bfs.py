@@ -0,0 +1,312 @@
+"""
+Breadth-first search with its layers on disk, for depths whose states do not fit in RAM.
+
+The search always starts from the solved cube, so one work directory holds the
+distance layers for every problem: layer_DD.bin is the sorted file of the
+records (the 9-byte state code plus the id of the move that reached it, as in
+parallel_bfs.py) of all states at distance DD. A layer is built in two passes:
+
+  expand   the previous layer is streamed from disk and expanded with the
+           canonical moves (partB.ALLOWED_NEXT); children are collected up to
+           run_records at a time, sorted and written as run files.
+  merge    the runs are merged in one streaming k-way merge that drops repeated
+           codes and the codes already in the two layers before (the only layers
+           a child can be in), read in step as sorted files: delayed duplicate
+           detection, so no visited set is ever held in memory.
+
+Memory is bounded by run_records whatever the depth; disk use is the layers plus
+the runs of the layer being built. A finished layer is written to a temporary
+file and renamed, then listed in manifest.json, so a search killed at any point
+resumes from the last finished layer when it is run again on the same directory.
+
+    python external_bfs.py WORK_DIR [--max-depth 10] [--run-records N] [--state "T:... F:... ..."]
+
+prints the number of states at each distance, or a solution of the given state.
+"""
+import argparse
+import heapq
+import json
+import mmap
+import os
+from bisect import bisect_left
+
+from cubie import STATE_BYTES, decode_state, encode_state, pack_state, unpack_state
+from parallel_bfs import RECORD_BYTES, _CodeView
+from partB import (ALLOWED_NEXT, MOVES, SOLVED_BUFFER, START_MOVE, Cube, SearchStats, apply_move, checked_buffer,
+                   format_moves, parse_cube_state, print_progress)
+
+DEFAULT_RUN_RECORDS = 1 << 20  # children sorted in memory per run file
+READ_RECORDS = 1 << 14         # records per read when streaming a file
+MANIFEST = 'manifest.json'
+
+def _read_records(path):
+    """Stream the fixed-size records of a file."""
+    with open(path, 'rb') as file:
+        while True:
+            data = file.read(READ_RECORDS * RECORD_BYTES)
+            if not data:
+                return
+            for offset in range(0, len(data), RECORD_BYTES):
+                yield data[offset:offset + RECORD_BYTES]
+
+def _read_codes(path):
+    for record in _read_records(path):
+        yield record[:STATE_BYTES]
+
+def _unique(records):
+    """
+    (code, move byte) once per code of sorted records. A code reached by different
+    moves gets START_MOVE, which lets its expansion use every move.
+    """
+    code = move = None
+    for record in records:
+        if record[:STATE_BYTES] == code:
+            if record[STATE_BYTES] != move:
+                move = START_MOVE
+            continue
+        if code is not None:
+            yield code, move
+        code, move = record[:STATE_BYTES], record[STATE_BYTES]
+    if code is not None:
+        yield code, move
+
+def _write_records(path, pairs):
+    """Write (code, move byte) pairs through a temporary file; return the record count."""
+    temp_path = f"{path}.tmp"
+    count = 0
+    chunk = bytearray()
+    with open(temp_path, 'wb') as file:
+        for code, move in pairs:
+            chunk += code
+            chunk.append(move)
+            count += 1
+            if len(chunk) >= READ_RECORDS * RECORD_BYTES:
+                file.write(chunk)
+                chunk.clear()
+        file.write(chunk)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_path, path)
+    return count
+
+class LayerStore:
+    """
+    The layer files of one work directory. sizes[d] is the number of states at
+    distance d of every finished layer; files of an unfinished layer are removed
+    when the store is opened.
+    """
+
+    def __init__(self, work_dir):
+        self.work_dir = work_dir
+        os.makedirs(work_dir, exist_ok=True)
+        manifest_path = os.path.join(work_dir, MANIFEST)
+        if os.path.exists(manifest_path):
+            with open(manifest_path, 'r') as file:
+                manifest = json.load(file)
+            if manifest.get('record_bytes') != RECORD_BYTES:
+                raise ValueError(f"{work_dir} holds layers in another record format")
+            self.sizes = manifest['sizes']
+        else:
+            self.sizes = []
+        self._maps = {}
+        self._clean()
+        if not self.sizes:
+            _write_records(self.path(0), [(pack_state(encode_state(SOLVED_BUFFER)), START_MOVE)])
+            self.sizes.append(1)
+            self._save()
+
+    def path(self, depth):
+        return os.path.join(self.work_dir, f"layer_{depth:02d}.bin")
+
+    def _run_path(self, depth, index):
+        return os.path.join(self.work_dir, f"layer_{depth:02d}.run{index:04d}")
+
+    def _clean(self):
+        """Drop runs, temporary files and layers the manifest does not list (left by a crash)."""
+        finished = {os.path.basename(self.path(depth)) for depth in range(len(self.sizes))}
+        for name in os.listdir(self.work_dir):
+            stale_layer = name.startswith('layer_') and name not in finished
+            stale_manifest = name.startswith(f"{MANIFEST}.") and name.endswith('.tmp')
+            if stale_layer or stale_manifest:
+                os.remove(os.path.join(self.work_dir, name))
+        for depth, size in enumerate(self.sizes):
+            if os.path.getsize(self.path(depth)) != size * RECORD_BYTES:
+                raise ValueError(f"{self.path(depth)} does not hold the {size} records of the manifest")
+
+    def _save(self):
+        path = os.path.join(self.work_dir, MANIFEST)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w') as file:
+            json.dump({'record_bytes': RECORD_BYTES, 'sizes': self.sizes}, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, path)
+
+    @property
+    def depth(self):
+        """The deepest finished layer."""
+        return len(self.sizes) - 1
+
+    # --- Lookups ---
+
+    def contains(self, depth, code):
+        """Whether the state code is in the layer, by binary search in the mapped file."""
+        if not self.sizes[depth]:
+            return False
+        view = self._maps.get(depth)
+        if view is None:
+            with open(self.path(depth), 'rb') as file:
+                view = self._maps[depth] = memoryview(mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ))
+        keys = _CodeView(view, self.sizes[depth])
+        index = bisect_left(keys, code)
+        return index < len(keys) and keys[index] == code
+
+    def find(self, code):
+        """The distance of the state code among the finished layers, or None."""
+        for depth in range(len(self.sizes)):
+            if self.contains(depth, code):
+                return depth
+        return None
+
+    def close(self):
+        for view in self._maps.values():
+            buffer = view.obj
+            view.release()
+            buffer.close()
+        self._maps.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    # --- Building ---
+
+    def extend(self, run_records=DEFAULT_RUN_RECORDS, stats=None, goal=None):
+        """
+        Build the next layer from the deepest one; returns True when the goal code
+        is in it. stats: optional SearchStats, which gets one record_depth per layer.
+        """
+        depth = self.depth
+        run_paths = []
+        records = []
+        expanded = generated = 0
+        for record in _read_records(self.path(depth)):
+            buffer = decode_state(unpack_state(record[:STATE_BYTES]))
+            for move_id in ALLOWED_NEXT[record[STATE_BYTES]]:
+                records.append(pack_state(encode_state(apply_move(buffer, move_id))) + bytes((move_id,)))
+            expanded += 1
+            if len(records) >= run_records:
+                generated += len(records)
+                run_paths.append(self._write_run(depth + 1, len(run_paths), records))
+                records.clear()
+                if stats is not None:
+                    stats.tick(depth + 1, expanded, self.sizes[depth], sum(self.sizes))
+        if records:
+            generated += len(records)
+            run_paths.append(self._write_run(depth + 1, len(run_paths), records))
+            records.clear()
+
+        known = heapq.merge(*(_read_codes(self.path(d)) for d in range(max(0, depth - 1), depth + 1)))
+        found = False
+
+        def new_states():
+            nonlocal found
+            known_code = next(known, None)
+            for code, move in _unique(heapq.merge(*map(_read_records, run_paths))):
+                while known_code is not None and known_code < code:
+                    known_code = next(known, None)
+                if code == known_code:
+                    continue
+                if code == goal:
+                    found = True
+                yield code, move
+
+        count = _write_records(self.path(depth + 1), new_states())
+        for path in run_paths:
+            os.remove(path)
+        self.sizes.append(count)
+        self._save()
+        if stats is not None:
+            stats.record_depth(depth + 1, expanded, generated, 0, generated - count, count, sum(self.sizes))
+        return found
+
+    def _write_run(self, depth, index, records):
+        records.sort()
+        path = self._run_path(depth, index)
+        _write_records(path, _unique(records))
+        return path
+
+def _search(store, max_depth, goal, run_records, stats, limits):
+    """Extend the store until the goal code is in a layer (return its depth) or max_depth; None then."""
+    if goal is not None:
+        depth = store.find(goal)
+        if depth is not None:
+            return depth
+    while store.depth < max_depth and store.sizes[-1]:
+        if limits is not None:
+            limits.check_time(stats)
+        if store.extend(run_records, stats, goal):
+            return store.depth
+    return None
+
+def _walk_back(store, buffer, depth):
+    """Moves from a state at the given distance to the solved cube, one layer at a time."""
+    path = []
+    for next_depth in range(depth - 1, -1, -1):
+        for move_id in range(len(MOVES)):
+            child = apply_move(buffer, move_id)
+            if store.contains(next_depth, pack_state(encode_state(child))):
+                path.append(MOVES[move_id])
+                buffer = child
+                break
+    return path
+
+def external_bfs_solve(initial_cube, work_dir, max_depth=20, run_records=DEFAULT_RUN_RECORDS, stats=None,
+                       limits=None):
+    """
+    Optimal solve from the distance layers in work_dir, building the layers that are
+    missing (and keeping them for later calls) until the state is in one.
+    limits: optional partB.SearchLimits; its deadline and cancel token are checked
+    between layers (memory does not grow with the search, so the other bounds do not apply).
+    Returns the (face, 'C'|'A'|'2') moves of an optimal solution, or None beyond max_depth.
+    """
+    if stats is None:
+        stats = SearchStats()
+    buffer = checked_buffer(initial_cube)
+    with LayerStore(work_dir) as store:
+        depth = _search(store, max_depth, pack_state(encode_state(buffer)), run_records, stats, limits)
+        stats.finish(depth is not None)
+        return None if depth is None else _walk_back(store, buffer, depth)
+
+def distance_distribution(work_dir, max_depth, run_records=DEFAULT_RUN_RECORDS, stats=None, limits=None):
+    """Number of states at each distance 0..max_depth from solved, building the layers that are missing."""
+    if stats is None:
+        stats = SearchStats()
+    with LayerStore(work_dir) as store:
+        _search(store, max_depth, None, run_records, stats, limits)
+        stats.finish(True)
+        return store.sizes[:max_depth + 1]
+
+# --- Main function ---
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Breadth-first search with its layers on disk.")
+    parser.add_argument('work_dir', help="directory of the layer files (reused and resumed across runs)")
+    parser.add_argument('--max-depth', type=int, default=8)
+    parser.add_argument('--run-records', type=int, default=DEFAULT_RUN_RECORDS,
+                        help="children sorted in memory per run file")
+    parser.add_argument('--state', default=None, help="solve this state instead of counting states")
+    args = parser.parse_args()
+
+    stats = SearchStats(observer=print_progress)
+    if args.state is None:
+        for depth, size in enumerate(distance_distribution(args.work_dir, args.max_depth, args.run_records, stats)):
+            print(depth, size)
+    else:
+        solution_moves = external_bfs_solve(Cube(state=parse_cube_state(args.state)), args.work_dir,
+                                            args.max_depth, args.run_records, stats)
+        if solution_moves is None:
+            print("No solution found")
+        else:
+            print(format_moves(solution_moves) or "Already solved")
@@ -0,0 +1,113 @@
+"""
+Iterative-deepening A* solver.
+
+Memory is linear in the search depth: the only state kept is the current path and
+one coordinate per pattern database. The heuristic is the max of the admissible
+pattern-database distances (see pattern_db), so the first solution is optimal in
+face turns (quarter and half turns each count as one move).
+"""
+import time
+
+from cubie import validate_buffer
+from partB import ALLOWED_NEXT, MOVES, SOLVED_BUFFER, START_MOVE, apply_moves, cube_to_buffer
+from pattern_db import default_databases
+
+FOUND = -1
+
+class IDAStats:
+    """Counters filled in by ida_star_solve, for tuning the heuristic."""
+
+    def __init__(self):
+        self.nodes_expanded = 0
+        self.heuristic_calls = 0
+        self.heuristic_time = 0.0
+        self.endgame_hits = 0
+        # One (bound, nodes expanded, seconds) entry per depth iteration.
+        self.iterations = []
+
+    def __repr__(self):
+        return (f"IDAStats(nodes_expanded={self.nodes_expanded}, heuristic_calls={self.heuristic_calls}, "
+                f"heuristic_time={self.heuristic_time:.3f}s, endgame_hits={self.endgame_hits}, "
+                f"iterations={self.iterations})")
+
+def _search(initial_state, coords, g, bound, last_move, path, databases, stats, endgame, limits):
+    start = time.perf_counter()
+    h = 0
+    for db, coord in zip(databases, coords):
+        distance = db.distance(coord)
+        if distance > h:
+            h = distance
+    stats.heuristic_time += time.perf_counter() - start
+    stats.heuristic_calls += 1
+
+    f = g + h
+    if f > bound:
+        return f
+    # Every tracked piece is home; check the stickers, as some pieces are not tracked.
+    if h == 0 and apply_moves(initial_state, path) == SOLVED_BUFFER:
+        return FOUND
+    # Within reach of the near-solved table the exact distance is known: finish
+    # the path from the table or cut the branch. A state missing from the table
+    # is more than endgame.depth moves away, which is a better bound than h.
+    # With more than endgame.depth moves left in the bound neither can happen,
+    # as a shorter solution would have ended an earlier iteration.
+    if endgame is not None and h <= endgame.depth and bound - g <= endgame.depth:
+        state = apply_moves(initial_state, path)
+        distance = endgame.distance(state)
+        if distance is None:
+            if g + endgame.depth + 1 > bound:
+                return g + endgame.depth + 1
+        else:
+            stats.endgame_hits += 1
+            if g + distance > bound:
+                return g + distance
+            path.extend(endgame.solve_buffer(state))
+            return FOUND
+
+    stats.nodes_expanded += 1
+    if limits is not None and not stats.nodes_expanded & 4095:
+        limits.check_time(stats)
+    minimum = None
+    move_count = len(MOVES)
+    for move_id in ALLOWED_NEXT[last_move]:
+        child = [db.move_table[coord * move_count + move_id] for db, coord in zip(databases, coords)]
+        path.append(move_id)
+        result = _search(initial_state, child, g + 1, bound, move_id, path, databases, stats, endgame, limits)
+        if result == FOUND:
+            return FOUND
+        path.pop()
+        if minimum is None or result < minimum:
+            minimum = result
+    return minimum
+
+def ida_star_solve(initial_cube, databases=None, max_depth=20, stats=None, endgame=None, limits=None):
+    """
+    Iterative-deepening A* with pattern-database heuristics.
+    databases: the PatternDatabase list to take the max of (default: one corner and
+    two edge-subset databases). stats: optional IDAStats to fill in.
+    endgame: optional endgame.NearSolvedTable; paths end as soon as they reach a
+    state in it, which saves its depth in plies off every iteration.
+    limits: optional partB.SearchLimits; only the deadline and the cancel token
+    apply, as memory stays linear in the depth. Reaching one raises SearchLimitExceeded.
+    Returns the list of (face, 'C'|'A'|'2') moves, or None if nothing is found within max_depth.
+    """
+    if databases is None:
+        databases = default_databases()
+    if stats is None:
+        stats = IDAStats()
+
+    initial_state = cube_to_buffer(initial_cube)
+    cubies = validate_buffer(initial_state)
+    coords = [db.coordinate(cubies) for db in databases]
+
+    bound = max(db.distance(coord) for db, coord in zip(databases, coords))
+    while bound is not None and bound <= max_depth:
+        start = time.perf_counter()
+        nodes_before = stats.nodes_expanded
+        path = []
+        result = _search(initial_state, coords, 0, bound, START_MOVE, path, databases, stats, endgame, limits)
+        stats.iterations.append((bound, stats.nodes_expanded - nodes_before, time.perf_counter() - start))
+        if result == FOUND:
+            return [MOVES[move_id] for move_id in path]
+        bound = result
+    return None
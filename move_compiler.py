@@ -0,0 +1,189 @@
+"""
+Compile move sequences into single sticker permutations.
+
+A move list is first simplified: turns of the same face in a row are merged
+(T C, T C -> T 2) or cancelled (T C, T A -> nothing), also across a turn of the
+opposite face, which commutes with them (T C, B C, T A -> B C), and the result is
+put in canonical order (see partB.ALLOWED_NEXT). The simplified moves are then
+composed into one permutation of the 54-sticker buffer, so applying the whole
+sequence is one indexing step however long it was.
+
+Repeating a sequence n times (MoveSequence ** n) squares permutations instead of
+composing n copies, and since every permutation of the cube has an order of at
+most 1260, the moves of the repetition are those of n mod order copies.
+
+    sequence = MoveSequence.parse("T C\\nB C\\nT A\\nF C")
+    sequence.moves()                   # [('B', 'C'), ('F', 'C')]
+    scrambled = sequence.apply(SOLVED_BUFFER)
+    (sequence ** 1000000).apply(scrambled)
+"""
+from math import lcm
+from operator import itemgetter
+
+from partB import INVERSE_MOVE, MOVE_IDS, MOVE_PERMS, MOVES, buffer_to_cube, cube_to_buffer
+
+IDENTITY = tuple(range(54))
+
+# Clockwise quarter turns of each direction, and back.
+_TURNS = {'C': 1, 'A': 3, '2': 2}
+_MOVE_TURNS = [_TURNS[direction] for _, direction in MOVES]
+_DIRECTION_OFFSET = {1: 0, 3: 1, 2: 2}
+
+def parse_moves(text):
+    """
+    Move indices of face/direction pairs, one or more per line ("F C" or "F C T A R 2").
+    Raises ValueError naming the line of a bad move.
+    """
+    move_ids = []
+    for line_number, line in enumerate(text.splitlines(), 1):
+        tokens = line.split()
+        if len(tokens) % 2:
+            raise ValueError(f"Invalid move format in line {line_number}: '{line.strip()}'")
+        for move in zip(tokens[::2], tokens[1::2]):
+            if move not in MOVE_IDS:
+                raise ValueError(f"Invalid move format in line {line_number}: '{line.strip()}'")
+            move_ids.append(MOVE_IDS[move])
+    return move_ids
+
+def simplify_move_ids(move_ids):
+    """
+    The canonical sequence with the same effect: same-face turns merged or cancelled,
+    also across a turn of the opposite face, and opposite faces in MOVE_FACES order.
+    """
+    out = []
+    for move_id in move_ids:
+        face = move_id // 3
+        # The turn can merge with the last move, or with the one before it when the
+        # last one turned the opposite face (the two commute).
+        position = len(out) - 1
+        if position >= 0 and out[position] // 3 == face ^ 1:
+            position -= 1
+        if position >= 0 and out[position] // 3 == face:
+            turns = (_MOVE_TURNS[out[position]] + _MOVE_TURNS[move_id]) % 4
+            if turns:
+                out[position] = face * 3 + _DIRECTION_OFFSET[turns]
+            else:
+                del out[position]
+        elif out and out[-1] // 3 == face ^ 1 and face < out[-1] // 3:
+            out.insert(len(out) - 1, move_id)
+        else:
+            out.append(move_id)
+    return out
+
+def simplify_moves(moves):
+    """simplify_move_ids for (face, direction) moves, e.g. a solver's output."""
+    return [MOVES[move_id] for move_id in simplify_move_ids(MOVE_IDS[move] for move in moves)]
+
+def compose(first, second):
+    """The permutation of applying first, then second (both new[i] == old[perm[i]])."""
+    return itemgetter(*second)(first)
+
+def compile_move_ids(move_ids):
+    """The single sticker permutation of a sequence of move indices."""
+    perm = IDENTITY
+    for move_id in move_ids:
+        perm = compose(perm, MOVE_PERMS[move_id])
+    return perm
+
+def permutation_power(perm, exponent):
+    """perm applied exponent (>= 0) times, in O(log exponent) compositions."""
+    result = IDENTITY
+    while exponent:
+        if exponent & 1:
+            result = compose(result, perm)
+        perm = compose(perm, perm)
+        exponent >>= 1
+    return result
+
+def permutation_order(perm):
+    """The smallest n > 0 with perm ** n the identity: the lcm of its cycle lengths."""
+    seen = [False] * len(perm)
+    order = 1
+    for start in range(len(perm)):
+        length = 0
+        i = start
+        while not seen[i]:
+            seen[i] = True
+            i = perm[i]
+            length += 1
+        if length:
+            order = lcm(order, length)
+    return order
+
+class MoveSequence:
+    """
+    A simplified move sequence and its sticker permutation.
+    move_ids: the sequence as move indices (see partB.MOVES); it is simplified here.
+    """
+
+    def __init__(self, move_ids=()):
+        self.move_ids = simplify_move_ids(move_ids)
+        self.perm = compile_move_ids(self.move_ids)
+        self._getter = itemgetter(*self.perm)
+
+    @classmethod
+    def parse(cls, text):
+        """A sequence from face/direction pairs, as read by parse_moves."""
+        return cls(parse_moves(text))
+
+    @classmethod
+    def from_moves(cls, moves):
+        """A sequence from (face, direction) moves."""
+        return cls(MOVE_IDS[move] for move in moves)
+
+    @classmethod
+    def _from_parts(cls, move_ids, perm):
+        sequence = cls.__new__(cls)
+        sequence.move_ids = move_ids
+        sequence.perm = perm
+        sequence._getter = itemgetter(*perm)
+        return sequence
+
+    def moves(self):
+        """The simplified sequence as (face, direction) moves."""
+        return [MOVES[move_id] for move_id in self.move_ids]
+
+    def __len__(self):
+        return len(self.move_ids)
+
+    def __eq__(self, other):
+        return isinstance(other, MoveSequence) and self.perm == other.perm
+
+    def __hash__(self):
+        return hash(self.perm)
+
+    def __repr__(self):
+        return f"MoveSequence({' '.join(f'{face} {direction}' for face, direction in self.moves())!r})"
+
+    # --- Applying ---
+
+    def apply(self, buffer):
+        """The 54-sticker buffer after the whole sequence, in one step."""
+        return bytes(self._getter(buffer))
+
+    def apply_cube(self, cube):
+        """A new Cube with the sequence applied to cube."""
+        return buffer_to_cube(self.apply(cube_to_buffer(cube)))
+
+    # --- Algebra ---
+
+    def __add__(self, other):
+        """This sequence followed by other."""
+        return MoveSequence._from_parts(simplify_move_ids(self.move_ids + other.move_ids),
+                                        compose(self.perm, other.perm))
+
+    def inverse(self):
+        return MoveSequence._from_parts([INVERSE_MOVE[move_id] for move_id in reversed(self.move_ids)],
+                                        tuple(sorted(range(54), key=self.perm.__getitem__)))
+
+    def __pow__(self, exponent):
+        """The sequence repeated exponent times (a negative exponent repeats the inverse)."""
+        if exponent < 0:
+            return self.inverse() ** -exponent
+        repeats = exponent % permutation_order(self.perm)
+        return MoveSequence._from_parts(simplify_move_ids(self.move_ids * repeats),
+                                        permutation_power(self.perm, exponent))
+
+def apply_scramble(cube, text):
+    """A new Cube with the face/direction pairs in text applied, compiled to one permutation."""
+    return MoveSequence.parse(text).apply_cube(cube)
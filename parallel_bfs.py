@@ -0,0 +1,239 @@
+"""
+Level-synchronous breadth-first search spread over worker processes.
+
+Each layer is a set of compact state records (the 9-byte state code plus the
+id of the move that reached it) held in multiprocessing.shared_memory blocks,
+split into hash partitions by zlib.crc32 of the code. A layer is built in two
+rounds of tasks:
+
+  expand   every chunk of the current layer is decoded and expanded with the
+           canonical moves (partB.ALLOWED_NEXT); children are written to a new
+           block, grouped by partition.
+  dedup    one task per partition drops the children that are already in the
+           previous or the current layer of that partition (the only layers a
+           child can be in) or that repeat, and writes the sorted new layer
+           partition.
+
+No process ever holds a global visited set, and only block names and sizes go
+through the pool's pipes. All layers are kept until the search ends so the
+solution can be walked back from the goal.
+"""
+import os
+import zlib
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+
+from cubie import STATE_BYTES, decode_state, encode_state, pack_state, unpack_state
+from partB import (ALLOWED_NEXT, INVERSE_MOVE, MOVES, SOLVED_BUFFER, START_MOVE, SearchStats, apply_move,
+                   checked_buffer, cube_to_buffer)
+
+RECORD_BYTES = STATE_BYTES + 1
+DEFAULT_CHUNK = 2048  # records per expand task
+
+def _partition(code, partitions):
+    return zlib.crc32(code) % partitions
+
+def _records(block, count):
+    data = block.buf[:count * RECORD_BYTES].tobytes()
+    return [data[offset:offset + RECORD_BYTES] for offset in range(0, len(data), RECORD_BYTES)]
+
+def _write_block(data):
+    """Copy data into a new shared memory block and return its name (None when empty)."""
+    if not data:
+        return None
+    block = SharedMemory(create=True, size=len(data))
+    block.buf[:len(data)] = data
+    name = block.name
+    block.close()
+    return name
+
+# --- Worker tasks ---
+
+def _expand_chunk(layer_name, start, stop, partitions):
+    """Expand records start..stop of a layer block; return (block name, bytes per partition)."""
+    layer = SharedMemory(name=layer_name)
+    try:
+        data = layer.buf[start * RECORD_BYTES:stop * RECORD_BYTES].tobytes()
+    finally:
+        layer.close()
+    buckets = [bytearray() for _ in range(partitions)]
+    for offset in range(0, len(data), RECORD_BYTES):
+        buffer = decode_state(unpack_state(data[offset:offset + STATE_BYTES]))
+        for move_id in ALLOWED_NEXT[data[offset + STATE_BYTES]]:
+            code = pack_state(encode_state(apply_move(buffer, move_id)))
+            bucket = buckets[zlib.crc32(code) % partitions]
+            bucket += code
+            bucket.append(move_id)
+    return _write_block(b''.join(buckets)), [len(bucket) for bucket in buckets]
+
+def _dedup_partition(segments, known_blocks, goal):
+    """
+    Build one partition of the next layer from (block name, offset, length) child
+    segments, leaving out the codes in the known (name, count) layer blocks.
+    Returns (block name, record count, whether the goal code is in it).
+    """
+    seen = set()
+    for name, count in known_blocks:
+        block = SharedMemory(name=name)
+        try:
+            seen.update(record[:STATE_BYTES] for record in _records(block, count))
+        finally:
+            block.close()
+    new = {}
+    for name, offset, length in segments:
+        block = SharedMemory(name=name)
+        try:
+            data = block.buf[offset:offset + length].tobytes()
+        finally:
+            block.close()
+        for position in range(0, length, RECORD_BYTES):
+            code = data[position:position + STATE_BYTES]
+            if code not in seen and code not in new:
+                new[code] = data[position + STATE_BYTES]
+    records = b''.join(code + bytes((new[code],)) for code in sorted(new))
+    return _write_block(records), len(new), goal in new
+
+# --- Driver ---
+
+class _Layers:
+    """The shared memory blocks of every layer, one (name, count) per partition, owned by the parent."""
+
+    def __init__(self, partitions):
+        self.partitions = partitions
+        self.layers = []
+        self.blocks = {}
+
+    def add(self, partition_blocks):
+        for name, _ in partition_blocks:
+            if name is not None and name not in self.blocks:
+                self.blocks[name] = SharedMemory(name=name)
+        self.layers.append(partition_blocks)
+
+    def size(self, depth):
+        return sum(count for _, count in self.layers[depth])
+
+    def contains(self, depth, code):
+        name, count = self.layers[depth][_partition(code, self.partitions)]
+        if name is None:
+            return False
+        view = self.blocks[name].buf
+        keys = _CodeView(view, count)
+        index = bisect_left(keys, code)
+        return index < count and keys[index] == code
+
+    def release(self, names):
+        for name in names:
+            block = self.blocks.pop(name, None)
+            if block is not None:
+                block.close()
+                block.unlink()
+
+    def close(self):
+        self.release(list(self.blocks))
+
+class _CodeView:
+    """Sequence view of the state codes in a sorted record block, for bisect."""
+
+    def __init__(self, view, count):
+        self.view, self.count = view, count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        offset = index * RECORD_BYTES
+        return self.view[offset:offset + STATE_BYTES].tobytes()
+
+def _layer_search(start, workers, max_depth, goal, chunk_size, limits=None):
+    """
+    Run the search from a sticker buffer. Returns (layers, goal depth or None);
+    the caller must close the layers to free the shared memory.
+    limits: optional partB.SearchLimits, checked after every layer.
+    """
+    stats = SearchStats()
+    workers = workers or os.cpu_count() or 1
+    partitions = workers
+    layers = _Layers(partitions)
+    start_code = pack_state(encode_state(start))
+    first = [(None, 0)] * partitions
+    first[_partition(start_code, partitions)] = (_write_block(start_code + bytes((START_MOVE,))), 1)
+    layers.add(first)
+    if start_code == goal:
+        return layers, 0
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for depth in range(max_depth):
+                current = layers.layers[depth]
+                jobs = [pool.submit(_expand_chunk, name, begin, min(begin + chunk_size, count), partitions)
+                        for name, count in current if name is not None
+                        for begin in range(0, count, chunk_size)]
+                children = [job.result() for job in jobs]
+                segments = [[] for _ in range(partitions)]
+                for name, lengths in children:
+                    offset = 0
+                    for partition, length in enumerate(lengths):
+                        if length:
+                            segments[partition].append((name, offset, length))
+                        offset += length
+                previous = layers.layers[depth - 1] if depth else [(None, 0)] * partitions
+                jobs = [pool.submit(_dedup_partition, segments[p],
+                                    [block for block in (previous[p], current[p]) if block[0] is not None],
+                                    goal)
+                        for p in range(partitions)]
+                results = [job.result() for job in jobs]
+                # The children blocks have been merged into the new layer.
+                for name, _ in children:
+                    if name is not None:
+                        block = SharedMemory(name=name)
+                        block.close()
+                        block.unlink()
+                layers.add([(name, count) for name, count, _ in results])
+                if any(found for _, _, found in results):
+                    return layers, depth + 1
+                if not layers.size(depth + 1):
+                    break
+                if limits is not None:
+                    stats.tick(depth + 1, 0, layers.size(depth + 1), sum(map(layers.size, range(depth + 2))))
+                    limits.check(stats)
+    except BaseException:
+        layers.close()
+        raise
+    return layers, None
+
+def _walk_back(layers, depth):
+    """Moves from the start to the solved cube, found by stepping back one layer at a time."""
+    path = []
+    current = SOLVED_BUFFER
+    for previous_depth in range(depth - 1, -1, -1):
+        for move_id in range(len(MOVES)):
+            previous = apply_move(current, INVERSE_MOVE[move_id])
+            if layers.contains(previous_depth, pack_state(encode_state(previous))):
+                path.append(move_id)
+                current = previous
+                break
+    path.reverse()
+    return [MOVES[move_id] for move_id in path]
+
+def parallel_bfs_solve(initial_cube, workers=None, max_depth=20, chunk_size=DEFAULT_CHUNK, limits=None):
+    """
+    Breadth-first search for the solved cube with layers expanded in worker processes.
+    limits: optional partB.SearchLimits, checked after every layer; reaching one
+    raises SearchLimitExceeded and frees the shared memory.
+    Returns the (face, 'C'|'A'|'2') moves of an optimal solution, or None.
+    """
+    layers, depth = _layer_search(checked_buffer(initial_cube), workers, max_depth,
+                                  pack_state(encode_state(SOLVED_BUFFER)), chunk_size, limits)
+    try:
+        return None if depth is None else _walk_back(layers, depth)
+    finally:
+        layers.close()
+
+def layer_sizes(max_depth, initial_cube=None, workers=None, chunk_size=DEFAULT_CHUNK):
+    """Number of states at each distance 0..max_depth from initial_cube (default: the solved cube)."""
+    start = SOLVED_BUFFER if initial_cube is None else cube_to_buffer(initial_cube)
+    layers, _ = _layer_search(start, workers, max_depth, None, chunk_size)
+    try:
+        return [layers.size(depth) for depth in range(len(layers.layers))]
+    finally:
+        layers.close()
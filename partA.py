@@ -73,9 +73,9 @@ class Cube:
         self.state['B'][1] = self.state['R'][3]
         self.state['B'][2] = self.state['R'][0]
         # right[0,3,6] = top[6,7,8]
-        self.state['R'][0] = temp[2]
+        self.state['R'][0] = temp[0]
         self.state['R'][3] = temp[1]
-        self.state['R'][6] = temp[0]
+        self.state['R'][6] = temp[2]
     
     #back clockwise
     def Back_Clockwise(self):
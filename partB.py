@@ -1,5 +1,13 @@
-from collections import deque
-import copy
+import functools
+import heapq
+import sys
+import time
+from array import array
+from collections import deque, namedtuple
+from operator import itemgetter
+
+from cubie import (STATE_BYTES, decode_cubies, encode_cubies, encode_state, facelets_to_cubies, pack_state,
+                   unpack_state, validate_buffer)
 
 # Cube class, contains all relevant functions
 class Cube:
@@ -77,9 +85,9 @@ class Cube:
         self.state['B'][1] = self.state['R'][3]
         self.state['B'][2] = self.state['R'][0]
         # Right[0,3,6] = Top[6,7,8]
-        self.state['R'][0] = temp[2]
+        self.state['R'][0] = temp[0]
         self.state['R'][3] = temp[1]
-        self.state['R'][6] = temp[0]
+        self.state['R'][6] = temp[2]
     
     # Back clockwise
     def Back_Clockwise(self):
@@ -138,10 +146,10 @@ class Cube:
     
     # Apply a move on cube based on moveId.
     def move_cube(self, faceId, moveId):
-        # One clockwise move, or three clockwise moves (which is equivalent to one anticlockwise move)
-        moveCount = 1 if moveId == "C" else 3 if moveId == "A" else None
+        # One clockwise move, two for a half turn, or three clockwise moves (which is equivalent to one anticlockwise move)
+        moveCount = {"C": 1, "2": 2, "A": 3}.get(moveId)
         if moveCount is None:
-            raise ValueError("Invalid move direction. Use 'C' or 'A'.")
+            raise ValueError("Invalid move direction. Use 'C', 'A' or '2'.")
         
         faceId_to_function = {
             "T": "Top_Clockwise",
@@ -174,130 +182,867 @@ class Cube:
 
     def get_neighbors(self):
         """Generate all possible next moves (neighbors)."""
-        moves = [('T', 'C'), ('T', 'A'), ('B', 'C'), ('B', 'A'), 
-                 ('F', 'C'), ('F', 'A'), ('A', 'C'), ('A', 'A'), 
-                 ('L', 'C'), ('L', 'A'), ('R', 'C'), ('R', 'A')]
-        neighbors = []
-        for move in moves:
-            new_cube = copy.deepcopy(self)  # Create a new cube instance
-            new_cube.move_cube(*move)
-            neighbors.append((new_cube.get_state_tuple(), move))  # Store state & move
-        return neighbors
+        # Children come straight from the sticker buffer, no copy of the cube is made.
+        return [(buffer_to_state_tuple(child), MOVES[move_id])
+                for child, move_id in expand(cube_to_buffer(self))]
+
+# --- Permutation move engine ---
+# The engine keeps a cube as one flat 54-sticker `bytes` buffer with the faces in
+# print order (T, F, R, A, L, B), so sticker i of a face lives at face_index * 9 + i.
+# Every move is a precomputed permutation of that buffer: applying it is a single
+# indexing step instead of a dozen dict-indexed list assignments.
+
+FACE_ORDER = ['T', 'F', 'R', 'A', 'L', 'B']
+
+# All 18 face turns. The face list pairs opposite faces (T/B, F/A, L/R), so
+# move_id // 3 is the face and move_id // 6 the axis. The quarter turns keep the
+# order used by Cube.get_neighbors.
+MOVE_FACES = ['T', 'B', 'F', 'A', 'L', 'R']
+MOVES = [(face, direction) for face in MOVE_FACES for direction in ('C', 'A', '2')]
+MOVE_IDS = {move: move_id for move_id, move in enumerate(MOVES)}
+QUARTER_TURN_IDS = [MOVE_IDS[(face, direction)] for face in MOVE_FACES for direction in ('C', 'A')]
+# C <-> A, a half turn is its own inverse.
+INVERSE_MOVE = [move_id + (1, -1, 0)[move_id % 3] for move_id in range(len(MOVES))]
+
+def _build_move_permutation(face, direction):
+    """
+    Trace labelled stickers through Cube.move_cube to get the permutation of a move.
+    The result satisfies new_buffer[i] == old_buffer[perm[i]].
+    """
+    labels = {face_id: [FACE_ORDER.index(face_id) * 9 + i for i in range(9)] for face_id in FACE_ORDER}
+    cube = Cube(state=labels)
+    cube.move_cube(face, direction)
+    return tuple(cube.state[face_id][i] for face_id in FACE_ORDER for i in range(9))
+
+MOVE_PERMS = [_build_move_permutation(face, direction) for face, direction in MOVES]
+_MOVE_GETTERS = [itemgetter(*perm) for perm in MOVE_PERMS]
+
+def cube_to_buffer(cube):
+    """Flatten a Cube into the 54-sticker buffer used by the move engine."""
+    return ''.join(''.join(cube.state[face]) for face in FACE_ORDER).encode('ascii')
+
+def checked_buffer(cube):
+    """
+    cube_to_buffer for the solver entry points: the buffer, once cubie.validate_buffer
+    has found it solvable. Raises cubie.InvalidCubeError (a ValueError) otherwise.
+    """
+    buffer = cube_to_buffer(cube)
+    validate_buffer(buffer)
+    return buffer
+
+def buffer_to_cube(buffer):
+    """Build a Cube back from a 54-sticker buffer."""
+    text = buffer.decode('ascii')
+    return Cube(state={face: list(text[i * 9:(i + 1) * 9]) for i, face in enumerate(FACE_ORDER)})
+
+def apply_move(buffer, move_id):
+    """Return the buffer after the move with index move_id (see MOVES)."""
+    return bytes(_MOVE_GETTERS[move_id](buffer))
+
+def expand(buffer, move_ids=QUARTER_TURN_IDS):
+    """
+    Generate the children of a buffer as (child_buffer, move_id) pairs.
+    Each child is one permutation of the parent buffer, nothing is copied or replayed.
+    """
+    return [(bytes(_MOVE_GETTERS[move_id](buffer)), move_id) for move_id in move_ids]
+
+def buffer_to_state_tuple(buffer):
+    """Same tuple Cube.get_state_tuple would give for this buffer."""
+    text = buffer.decode('ascii')
+    return tuple(tuple(text[i * 9:(i + 1) * 9]) for i in range(len(FACE_ORDER)))
+
+def apply_moves(buffer, move_ids):
+    """Apply a sequence of move indices to a buffer."""
+    for move_id in move_ids:
+        buffer = bytes(_MOVE_GETTERS[move_id](buffer))
+    return buffer
+
+SOLVED_BUFFER = cube_to_buffer(Cube())
+
+# --- Canonical move sequences ---
+# Many move sequences reach the same state: turning one face twice in a row is a
+# single turn (or nothing), and the two faces of an axis commute, so T B == B T.
+# A sequence is canonical when it never turns the same face twice in a row and,
+# of two opposite faces, turns the one listed first in MOVE_FACES first. Every
+# state at distance d still has a canonical solution of length d, and half turns
+# count as single moves. ALLOWED_NEXT[last_move_id] lists the moves that keep a
+# sequence canonical; ALLOWED_NEXT[START_MOVE] is every move, for the first one.
+START_MOVE = len(MOVES)
+
+def _allowed_after(last_move_id):
+    if last_move_id == START_MOVE:
+        return tuple(range(len(MOVES)))
+    last_face = last_move_id // 3
+    return tuple(move_id for move_id in range(len(MOVES))
+                 if move_id // 3 != last_face and not (move_id // 3 ^ 1 == last_face and move_id // 3 < last_face))
+
+ALLOWED_NEXT = [_allowed_after(last_move_id) for last_move_id in range(len(MOVES) + 1)]
+
+# The same moves at cubie level: (cp, co, ep, eo) of each move applied to the solved cube.
+CUBIE_MOVES = [facelets_to_cubies(apply_move(SOLVED_BUFFER, move_id)) for move_id in range(len(MOVES))]
+
+# --- Path reconstruction ---
+# Searches record one (parent index, move byte) pair per visited state instead of
+# carrying a copy of the move list on every frontier entry. The root has parent -1.
+NO_MOVE = 255
+
+def new_search_tree():
+    """Return the parent and move arrays of a search tree holding only the root."""
+    return array('l', [-1]), bytearray([NO_MOVE])
+
+def reconstruct_path(parents, moves, node):
+    """Walk the parent pointers from node back to the root and return the moves in order."""
+    path = []
+    while parents[node] >= 0:
+        path.append(MOVES[moves[node]])
+        node = parents[node]
+    path.reverse()
+    return path
+
+# --- Compact visited-set backend ---
+
+class PackedStateSet:
+    """
+    Open-addressing hash set of state codes (see cubie.encode_state).
+    A code needs 66 bits: each slot keeps the low 64 bits in an array('Q') and the
+    rest, plus one, in a bytearray (0 marks an empty slot). That is 9 bytes per slot,
+    and the table is kept between 3/8 and 3/4 full, so 12 to 24 bytes per state
+    (about 18 on average): against about 130 for a 54-byte buffer in a set, but
+    every probe runs in Python, so inserts are about 200 times slower than set.add.
+    """
+    MAX_LOAD = 0.75
+
+    def __init__(self, capacity=1024):
+        size = 1
+        while size * self.MAX_LOAD < capacity:
+            size *= 2
+        self._low = array('Q', bytes(8 * size))
+        self._high = bytearray(size)
+        self._count = 0
+
+    def _find(self, code):
+        """Index of the slot holding code, or of the empty slot where it would go."""
+        low = code & 0xFFFFFFFFFFFFFFFF
+        high = (code >> 64) + 1
+        mask = len(self._high) - 1
+        slot = (code * 0x9E3779B97F4A7C15 >> 40) & mask
+        while self._high[slot] and (self._high[slot] != high or self._low[slot] != low):
+            slot = (slot + 1) & mask
+        return slot
+
+    def __contains__(self, code):
+        return self._high[self._find(code)] != 0
+
+    def add(self, code):
+        slot = self._find(code)
+        if self._high[slot]:
+            return
+        self._low[slot] = code & 0xFFFFFFFFFFFFFFFF
+        self._high[slot] = (code >> 64) + 1
+        self._count += 1
+        if self._count > len(self._high) * self.MAX_LOAD:
+            self._grow()
+
+    def _grow(self):
+        old_low, old_high = self._low, self._high
+        self._low = array('Q', bytes(16 * len(old_high)))
+        self._high = bytearray(2 * len(old_high))
+        for slot, high in enumerate(old_high):
+            if high:
+                code = (high - 1) << 64 | old_low[slot]
+                new_slot = self._find(code)
+                self._low[new_slot] = old_low[slot]
+                self._high[new_slot] = high
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        for slot, high in enumerate(self._high):
+            if high:
+                yield (high - 1) << 64 | self._low[slot]
+
+    @property
+    def nbytes(self):
+        """Memory held by the table itself."""
+        return len(self._high) * (self._low.itemsize + 1)
+
+# Records of an open LayeredStateSet layer: the packed code and the move that reached it.
+_LAYER_RECORD_BYTES = STATE_BYTES + 1
+LAYER_RUN_RECORDS = 1 << 15  # records sorted at a time when a layer is sealed
+
+class LayeredStateSet:
+    """
+    The layers of a breadth-first search as sorted arrays of packed state codes
+    (see cubie.pack_state): 9 bytes per state, looked up by binary search.
+    add() appends a code and the move that reached it to the open layer, an
+    unsorted bytearray of 10-byte records that may repeat. seal() sorts it a run
+    at a time, merges the runs, and drops repeats and the codes of the two layers
+    before, the only layers a child can already be in (delayed duplicate
+    detection, as in external_bfs.py). bfs_pruning searches over it without
+    sticker buffers or a search tree: the frontier is the last layer, decoded one
+    state at a time, and the path is found by walking back through the layers.
+    """
+
+    def __init__(self):
+        self.layers = []
+        self._open = bytearray()
+        self._count = 0
+
+    def add(self, code, move_id=START_MOVE):
+        self._open += pack_state(code)
+        self._open.append(move_id)
+
+    def contains(self, depth, code):
+        """Whether the code is in the sealed layer at depth, by binary search."""
+        layer, key = self.layers[depth], pack_state(code)
+        low, high = 0, len(layer) // STATE_BYTES
+        while low < high:
+            middle = (low + high) // 2
+            if layer[middle * STATE_BYTES:(middle + 1) * STATE_BYTES] < key:
+                low = middle + 1
+            else:
+                high = middle
+        return layer[low * STATE_BYTES:(low + 1) * STATE_BYTES] == key
+
+    def __contains__(self, code):
+        return any(self.contains(depth, code) for depth in range(len(self.layers)))
+
+    def _sorted_records(self):
+        """The open records in order: each run is sorted in place, then the runs are merged."""
+        records = self._open
+        size = len(records) // _LAYER_RECORD_BYTES
+        runs = []
+        for start in range(0, size, LAYER_RUN_RECORDS):
+            stop = min(size, start + LAYER_RUN_RECORDS)
+            run = sorted(bytes(records[i * _LAYER_RECORD_BYTES:(i + 1) * _LAYER_RECORD_BYTES])
+                         for i in range(start, stop))
+            records[start * _LAYER_RECORD_BYTES:stop * _LAYER_RECORD_BYTES] = b''.join(run)
+            runs.append(range(start, stop))
+        return heapq.merge(*((bytes(records[i * _LAYER_RECORD_BYTES:(i + 1) * _LAYER_RECORD_BYTES]) for i in run)
+                             for run in runs))
+
+    def seal(self):
+        """
+        Close the open layer and return the move that reached each of its states, in
+        layer order. A state reached by different moves gets START_MOVE.
+        """
+        known = heapq.merge(*(_layer_codes(layer) for layer in self.layers[-2:]))
+        known_code = next(known, None)
+        codes, moves = bytearray(), bytearray()
+        last_code = None
+        for record in self._sorted_records():
+            code, move_id = record[:STATE_BYTES], record[STATE_BYTES]
+            if code == last_code:
+                if moves[-1] != move_id:
+                    moves[-1] = START_MOVE
+                continue
+            while known_code is not None and known_code < code:
+                known_code = next(known, None)
+            if code == known_code:
+                continue
+            codes += code
+            moves.append(move_id)
+            last_code = code
+        self._open = bytearray()
+        self.layers.append(bytes(codes))
+        self._count += len(moves)
+        return bytes(moves)
+
+    @property
+    def pending(self):
+        """Records added to the open layer, repeats included."""
+        return len(self._open) // _LAYER_RECORD_BYTES
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def nbytes(self):
+        """Memory held by the layers and the open records."""
+        return sum(map(len, self.layers)) + len(self._open)
+
+def _layer_codes(layer):
+    for offset in range(0, len(layer), STATE_BYTES):
+        yield layer[offset:offset + STATE_BYTES]
+
+# --- Search instrumentation ---
+
+# Counters of one BFS layer: states expanded, children generated, moves skipped by
+# the canonical filter, children already visited, and the frontier and visited
+# sizes when the layer is done. side is 'forward' or 'backward' for bidirectional_solve.
+DepthStats = namedtuple('DepthStats', ['depth', 'expanded', 'generated', 'pruned', 'duplicates', 'frontier',
+                                       'visited', 'seconds', 'side'], defaults=('forward',))
+
+class SearchStats:
+    """
+    Counters filled in by the BFS solvers, one DepthStats per finished layer.
+    observer: optional callable observer(event, stats), called with 'depth' after
+    each layer, 'progress' at most every interval seconds within a long layer, and
+    'done' at the end. The solvers only keep local counters in their loops and hand
+    them over at layer boundaries, so the counters cost next to nothing without an observer.
+    """
+
+    def __init__(self, observer=None, interval=1.0):
+        self.observer = observer
+        self.interval = interval
+        self.depths = []
+        self.solved = None
+        self.fallback = None  # the solver that took over after a memory limit, if any
+        self.depth = 0
+        self.expanded = 0
+        self.frontier = 0
+        self.visited = 0
+        self.start = self._mark = self._last_report = time.perf_counter()
+        self.seconds = 0.0
+
+    @property
+    def nodes_expanded(self):
+        return sum(entry.expanded for entry in self.depths)
+
+    @property
+    def states_per_second(self):
+        # self.expanded counts the layer in progress, which is not in self.depths yet.
+        return (self.nodes_expanded + self.expanded) / self.seconds if self.seconds else 0.0
+
+    def record_depth(self, depth, expanded, generated, pruned, duplicates, frontier, visited, side='forward'):
+        now = time.perf_counter()
+        self.depths.append(DepthStats(depth, expanded, generated, pruned, duplicates, frontier, visited,
+                                      now - self._mark, side))
+        self._mark = now
+        self.depth, self.expanded, self.frontier, self.visited = depth, 0, frontier, visited
+        self.seconds = now - self.start
+        if self.observer is not None:
+            self.observer('depth', self)
+
+    def tick(self, depth, expanded, frontier, visited):
+        """Progress within a layer; reported to the observer at most every interval seconds."""
+        now = time.perf_counter()
+        self.depth, self.expanded, self.frontier, self.visited = depth, expanded, frontier, visited
+        self.seconds = now - self.start
+        if self.observer is not None and now - self._last_report >= self.interval:
+            self._last_report = now
+            self.observer('progress', self)
+
+    def finish(self, solved):
+        self.solved = solved
+        self.seconds = time.perf_counter() - self.start
+        if self.observer is not None:
+            self.observer('done', self)
+
+    def __repr__(self):
+        return (f"SearchStats(solved={self.solved}, nodes_expanded={self.nodes_expanded}, "
+                f"seconds={self.seconds:.3f}, depths={len(self.depths)})")
+
+def print_progress(event, stats, file=None):
+    """An observer for SearchStats that writes one line per event to stderr."""
+    file = sys.stderr if file is None else file
+    if event == 'depth':
+        entry = stats.depths[-1]
+        print(f"depth {entry.depth} ({entry.side}): {entry.expanded} expanded, {entry.duplicates} duplicates, "
+              f"frontier {entry.frontier}, visited {entry.visited}, {entry.seconds:.2f}s", file=file)
+    elif event == 'progress':
+        print(f"depth {stats.depth}: {stats.expanded} expanded so far, frontier {stats.frontier}, "
+              f"visited {stats.visited}, {stats.states_per_second:.0f} states/s", file=file)
+    else:
+        print(f"{'solved' if stats.solved else 'not solved'}: {stats.nodes_expanded} expanded in "
+              f"{stats.seconds:.2f}s", file=file)
+
+# --- Resource limits ---
+
+# Approximate memory per visited state of the BFS solvers (sticker buffer, set slot,
+# frontier entry and search tree node), measured with tracemalloc on bfs_pruning.
+BYTES_PER_STATE = 230
+# The same for bfs_pruning over a LayeredStateSet: a 9-byte code and a move byte.
+LAYERED_BYTES_PER_STATE = 10
+
+class SearchLimitExceeded(Exception):
+    """
+    A solver stopped at one of its SearchLimits. reason is 'cancelled', 'deadline',
+    'max_states' or 'max_bytes'; stats holds what the search gathered until then.
+    """
+
+    def __init__(self, reason, stats=None):
+        super().__init__(f"search stopped: {reason}")
+        self.reason = reason
+        self.stats = stats
+
+class SearchLimits:
+    """
+    Bounds for one solve. max_states and max_bytes are checked as states are
+    stored (see state_cap), the deadline and the cancel token every 4096 expanded states.
+    max_states: visited states; max_bytes: estimated memory of the search (see
+    BYTES_PER_STATE); timeout: wall-clock seconds from when the limits are made;
+    cancel: a threading.Event (or anything with is_set()) another thread can set.
+    fallback: when a BFS solver reaches max_states or max_bytes, drop its visited
+    set and solve with IDA* instead, whose memory does not grow with the search.
+    The deadline and the cancel token still apply to it.
+    """
+
+    def __init__(self, max_states=None, max_bytes=None, timeout=None, cancel=None, fallback=False):
+        self.max_states = max_states
+        self.max_bytes = max_bytes
+        self.deadline = None if timeout is None else time.monotonic() + timeout
+        self.cancel = cancel
+        self.fallback = fallback
+
+    def remaining(self):
+        """Seconds left before the deadline, or None without one."""
+        return None if self.deadline is None else max(0.0, self.deadline - time.monotonic())
+
+    def check_time(self, stats=None):
+        """Raise SearchLimitExceeded if the search was cancelled or is past its deadline."""
+        if self.cancel is not None and self.cancel.is_set():
+            raise SearchLimitExceeded('cancelled', stats)
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            raise SearchLimitExceeded('deadline', stats)
+
+    def state_cap(self, bytes_per_state=BYTES_PER_STATE):
+        """
+        The most visited states max_states and max_bytes allow (infinity without
+        them). The solvers compare their count with it on every insert, which is a
+        single integer comparison, and call check once it is passed.
+        """
+        cap = float('inf')
+        if self.max_states is not None:
+            cap = self.max_states
+        if self.max_bytes is not None:
+            cap = min(cap, self.max_bytes // bytes_per_state)
+        return cap
+
+    def check(self, stats, bytes_per_state=BYTES_PER_STATE):
+        """Raise SearchLimitExceeded if any limit is reached, given the stats of a BFS solver."""
+        self.check_time(stats)
+        if self.max_states is not None and stats.visited > self.max_states:
+            raise SearchLimitExceeded('max_states', stats)
+        if self.max_bytes is not None and stats.visited * bytes_per_state > self.max_bytes:
+            raise SearchLimitExceeded('max_bytes', stats)
+
+def _bounded(search):
+    """Give a BFS entry point a limits=None argument that can fall back to IDA* (see SearchLimits)."""
+    @functools.wraps(search)
+    def solve(initial_cube, *args, limits=None, **kwargs):
+        try:
+            return search(initial_cube, *args, limits=limits, **kwargs)
+        except SearchLimitExceeded as e:
+            if limits is None or not limits.fallback or e.reason not in ('max_states', 'max_bytes'):
+                raise
+            stats = e.stats
+        # Past the except block the traceback is gone, and with it the frames holding the visited set.
+        from ida_star import ida_star_solve
+        stats.fallback = 'ida_star'
+        return ida_star_solve(initial_cube, limits=limits)
+    return solve
 
 # BFS Algorithm (for completeness)
-def bfs_solve(initial_cube):
+@_bounded
+def bfs_solve(initial_cube, stats=None, limits=None):
     """Breadth-First Search to find solution to a Rubik's Cube with basic pruning.
-       Pruning rule: do not perform a move on the same face consecutively.
+       Pruning rule: only canonical move sequences are explored (see ALLOWED_NEXT).
+       stats: optional SearchStats to fill in.
+       limits: optional SearchLimits; reaching one raises SearchLimitExceeded.
     """
-    count = 0
-    initial_state = initial_cube.get_state_tuple()
-    goal_state = Cube().get_state_tuple()  # The solved state
+    if stats is None:
+        stats = SearchStats()
+    watched = stats.observer is not None or limits is not None
+    initial_state = checked_buffer(initial_cube)
+    goal_state = SOLVED_BUFFER  # The solved state
 
-    frontier = deque([(initial_cube, [])])  # Each element is (Cube instance, path of moves)
+    state_cap = float('inf') if limits is None else limits.state_cap()
+    parents, moves = new_search_tree()
+    frontier = deque([(initial_state, 0)])  # Each element is (sticker buffer, node index in the search tree)
     visited = set()
     visited.add(initial_state)
 
+    # Counters of the current depth; node ids grow with depth, so a node past layer_end starts the next one.
+    depth, layer_end = 0, 0
+    expanded = generated = pruned = duplicates = 0
     while frontier:
-        current_cube, path = frontier.popleft()
-        
+        current_state, node = frontier.popleft()
+        if node > layer_end:
+            stats.record_depth(depth, expanded, generated, pruned, duplicates, len(frontier) + 1, len(visited))
+            depth, layer_end = depth + 1, len(moves) - 1
+            expanded = generated = pruned = duplicates = 0
+
         # Check if we have reached the solved state.
-        if current_cube.get_state_tuple() == goal_state:
-            return path  # Return the sequence of moves that solved the cube
+        if current_state == goal_state:
+            stats.record_depth(depth, expanded, generated, pruned, duplicates, len(frontier) + 1, len(visited))
+            stats.finish(True)
+            return reconstruct_path(parents, moves, node)  # Return the sequence of moves that solved the cube
 
+        expanded += 1
+        if watched and not expanded & 4095:
+            stats.tick(depth, expanded, len(frontier), len(visited))
+            if limits is not None:
+                limits.check_time(stats)
         # Generate neighbors.
-        for next_state, move in current_cube.get_neighbors():
-            # --- Pruning step ---
-            # If the last move in the path was on the same face, skip this neighbor.
-            # This avoids immediately undoing or overcomplicating the previous move.
-            if path and move[0] == path[-1][0]:
-                continue
-
+        # --- Pruning step ---
+        # Only moves that keep the path canonical (see ALLOWED_NEXT) are tried: never the
+        # same face twice in a row, and opposite faces in one order only.
+        allowed = ALLOWED_NEXT[moves[node] if node else START_MOVE]
+        generated += len(allowed)
+        pruned += len(MOVES) - len(allowed)
+        for next_state, move_id in expand(current_state, allowed):
             if next_state not in visited:
                 visited.add(next_state)
-                # Create a new cube state by applying the move.
-                new_cube = copy.deepcopy(current_cube)
-                new_cube.move_cube(*move)
-                frontier.append((new_cube, path + [move]))  # Append new move sequence
-                count +=1
-                print(path, count)
+                parents.append(node)
+                moves.append(move_id)
+                frontier.append((next_state, len(moves) - 1))
+                if len(visited) > state_cap:
+                    stats.tick(depth, expanded, len(frontier), len(visited))
+                    limits.check(stats)
+            else:
+                duplicates += 1
 
+    stats.record_depth(depth, expanded, generated, pruned, duplicates, 0, len(visited))
+    stats.finish(False)
     return None  # If no solution is found.
 
 # Simple BFS without pruning
-def bfs(initial_cube):
-    """Breadth-First Search to find solution to a Rubik's Cube."""
-    
-    # Initialize a counter for the number of states processed.
-    num_explored = 0
-    
-    initial_state = initial_cube.get_state_tuple()
-    goal_state = Cube().get_state_tuple()  # The solved state
+@_bounded
+def bfs(initial_cube, stats=None, limits=None):
+    """Breadth-First Search to find solution to a Rubik's Cube.
+       stats: optional SearchStats to fill in.
+       limits: optional SearchLimits; reaching one raises SearchLimitExceeded.
+    """
+    if stats is None:
+        stats = SearchStats()
+    watched = stats.observer is not None or limits is not None
+
+    initial_state = checked_buffer(initial_cube)
+    goal_state = SOLVED_BUFFER  # The solved state
 
-    frontier = deque([(initial_cube, [])])  # (Cube state, Path to reach it)
+    state_cap = float('inf') if limits is None else limits.state_cap()
+    frontier = deque([(initial_state, [])])  # (sticker buffer, Path to reach it)
     visited = set()
     visited.add(initial_state)
 
+    depth = 0
+    expanded = generated = duplicates = 0
     while frontier:
-        current_cube, path = frontier.popleft()
-        num_explored += 1  # A state is now being expanded.
+        current_state, path = frontier.popleft()
+        if len(path) > depth:
+            stats.record_depth(depth, expanded, generated, 0, duplicates, len(frontier) + 1, len(visited))
+            depth += 1
+            expanded = generated = duplicates = 0
 
-        if current_cube.get_state_tuple() == goal_state:
+        if current_state == goal_state:
+            stats.record_depth(depth, expanded, generated, 0, duplicates, len(frontier) + 1, len(visited))
+            stats.finish(True)
             return path  # Return solution
 
-        for next_state, move in current_cube.get_neighbors():
+        expanded += 1  # A state is now being expanded.
+        if watched and not expanded & 4095:
+            stats.tick(depth, expanded, len(frontier), len(visited))
+            if limits is not None:
+                limits.check_time(stats)
+        for next_state, move_id in expand(current_state):
+            generated += 1
             if next_state not in visited:
                 visited.add(next_state)
-                new_cube = copy.deepcopy(current_cube)
-                new_cube.move_cube(*move)
-                frontier.append((new_cube, path + [move]))  # Append new move sequence
-                count+=1
-                print(path,count)
-                
-                
-    print("Number of states explored:", num_explored)
+                frontier.append((next_state, path + [MOVES[move_id]]))  # Append new move sequence
+                if len(visited) > state_cap:
+                    stats.tick(depth, expanded, len(frontier), len(visited))
+                    limits.check(stats)
+            else:
+                duplicates += 1
+
+    stats.record_depth(depth, expanded, generated, 0, duplicates, 0, len(visited))
+    stats.finish(False)
     return None  # No solution found
   
 #BFS with pruning
-def bfs_pruning(initial_cube):
+@_bounded
+def bfs_pruning(initial_cube, visited=None, stats=None, limits=None):
     """
     Breadth-First Search with basic pruning.
-    Pruning rule: do not perform a move on the same face consecutively.
+    Pruning rule: only canonical move sequences are explored (see ALLOWED_NEXT),
+    with half turns as single moves, so the path found is optimal in face turns.
+    visited: how visited states are kept. The default, a set of sticker buffers,
+    is the fastest; with the frontier and the search tree, which hold sticker
+    buffers too, the search takes about 230 bytes per state (BYTES_PER_STATE).
+    An empty PackedStateSet stores compact cubie.encode_state codes instead,
+    12 to 24 bytes per state, but as the frontier and tree are unchanged the peak
+    only drops by about a fifth, for a search about 12 times slower. An empty
+    LayeredStateSet runs a layer-at-a-time search over packed codes at cubie
+    level, with neither sticker buffers nor a search tree: 9 bytes per state plus
+    10 per child of the layer being built (about 20 per state of that layer while
+    it is sealed). Each child costs about 7 times as much as with the default, but
+    the goal is tested as children are made, not a layer later when they are
+    popped: a depth-5 scramble took 1.1 s and 5 MB, against 4.3 s and 345 MB.
+    stats: optional SearchStats to fill in.
+    limits: optional SearchLimits; reaching one raises SearchLimitExceeded.
     """
-    initial_state = initial_cube.get_state_tuple()
-    goal_state = Cube().get_state_tuple()  # The solved state
+    if stats is None:
+        stats = SearchStats()
+    initial_state = checked_buffer(initial_cube)
+    if isinstance(visited, LayeredStateSet):
+        return _layered_bfs(initial_state, visited, stats, limits)
+    watched = stats.observer is not None or limits is not None
+    goal_state = SOLVED_BUFFER  # The solved state
 
-    frontier = deque([(initial_cube, [])])  # Each element is (Cube instance, path of moves)
-    visited = set()
-    visited.add(initial_state)
-    
-    # Initialize a counter for the number of states processed.
-    num_explored = 0
+    state_key = None if visited is None else encode_state
+    if visited is None:
+        visited = set()
 
+    state_cap = float('inf') if limits is None else limits.state_cap()
+    parents, moves = new_search_tree()
+    frontier = deque([(initial_state, 0)])  # Each element is (sticker buffer, node index in the search tree)
+    visited.add(state_key(initial_state) if state_key else initial_state)
+
+    # Counters of the current depth; node ids grow with depth, so a node past layer_end starts the next one.
+    depth, layer_end = 0, 0
+    expanded = generated = pruned = duplicates = 0
     while frontier:
-        current_cube, path = frontier.popleft()
-        num_explored += 1  # A state is now being expanded.
-        
+        current_state, node = frontier.popleft()
+        if node > layer_end:
+            stats.record_depth(depth, expanded, generated, pruned, duplicates, len(frontier) + 1, len(visited))
+            depth, layer_end = depth + 1, len(moves) - 1
+            expanded = generated = pruned = duplicates = 0
+
         # Check if we've reached the solved state.
-        if current_cube.get_state_tuple() == goal_state:
-            print("Number of states explored:", num_explored)
-            return path  # Return the sequence of moves that solved the cube
-
-        # Generate neighbors and apply pruning.
-        for next_state, move in current_cube.get_neighbors():
-            # Pruning: avoid applying a move on the same face consecutively.
-            if path and move[0] == path[-1][0]:
-                continue
+        if current_state == goal_state:
+            stats.record_depth(depth, expanded, generated, pruned, duplicates, len(frontier) + 1, len(visited))
+            stats.finish(True)
+            return reconstruct_path(parents, moves, node)  # Return the sequence of moves that solved the cube
 
-            if next_state not in visited:
-                visited.add(next_state)
-                # Create a new cube state by applying the move.
-                new_cube = copy.deepcopy(current_cube)
-                new_cube.move_cube(*move)
-                frontier.append((new_cube, path + [move]))
+        expanded += 1  # A state is now being expanded.
+        if watched and not expanded & 4095:
+            stats.tick(depth, expanded, len(frontier), len(visited))
+            if limits is not None:
+                limits.check_time(stats)
+        # Generate neighbors and apply pruning: only the moves that keep the path
+        # canonical, so commuting opposite-face turns are generated in one order only.
+        allowed = ALLOWED_NEXT[moves[node] if node else START_MOVE]
+        generated += len(allowed)
+        pruned += len(MOVES) - len(allowed)
+        for next_state, move_id in expand(current_state, allowed):
+            key = state_key(next_state) if state_key else next_state
+            if key not in visited:
+                visited.add(key)
+                parents.append(node)
+                moves.append(move_id)
+                frontier.append((next_state, len(moves) - 1))
+                if len(visited) > state_cap:
+                    stats.tick(depth, expanded, len(frontier), len(visited))
+                    limits.check(stats)
+            else:
+                duplicates += 1
+
+    stats.record_depth(depth, expanded, generated, pruned, duplicates, 0, len(visited))
+    stats.finish(False)
+    return None  # If no solution is found.
+
+def _layered_bfs(initial_state, store, stats, limits):
+    """
+    bfs_pruning over a LayeredStateSet: each layer is expanded at cubie level
+    (CUBIE_MOVES) into the open layer, which is then sealed; the goal is looked
+    for among the children, and the path found by walking back through the layers.
+    """
+    watched = stats.observer is not None or limits is not None
+    # Children are counted as they are added, repeats included, at the layered cost per state.
+    state_cap = float('inf') if limits is None else limits.state_cap(LAYERED_BYTES_PER_STATE)
+    goal_code = encode_state(SOLVED_BUFFER)
+    store.add(encode_state(initial_state))
+    last_moves = store.seal()
+    if encode_state(initial_state) == goal_code:
+        stats.record_depth(0, 0, 0, 0, 0, 1, len(store))
+        stats.finish(True)
+        return []
+    depth = 0
+    while last_moves:
+        layer = store.layers[depth]
+        expanded = generated = pruned = 0
+        for index, last_move in enumerate(last_moves):
+            cp, co, ep, eo = decode_cubies(unpack_state(layer[index * STATE_BYTES:(index + 1) * STATE_BYTES]))
+            expanded += 1
+            if watched and not expanded & 4095:
+                stats.tick(depth, expanded, len(last_moves), len(store) + store.pending)
+                if limits is not None:
+                    limits.check_time(stats)
+            allowed = ALLOWED_NEXT[last_move]
+            generated += len(allowed)
+            pruned += len(MOVES) - len(allowed)
+            for move_id in allowed:
+                move_cp, move_co, move_ep, move_eo = CUBIE_MOVES[move_id]
+                code = encode_cubies([cp[i] for i in move_cp], [(co[i] + o) % 3 for i, o in zip(move_cp, move_co)],
+                                     [ep[i] for i in move_ep], [(eo[i] + o) % 2 for i, o in zip(move_ep, move_eo)])
+                if code == goal_code:
+                    stats.record_depth(depth, expanded, generated, pruned, 0, store.pending + 1,
+                                       len(store) + store.pending + 1)
+                    stats.finish(True)
+                    return _layered_path(store, depth)
+                store.add(code, move_id)
+                if len(store) + store.pending > state_cap:
+                    stats.tick(depth, expanded, len(last_moves), len(store) + store.pending)
+                    limits.check(stats, LAYERED_BYTES_PER_STATE)
+        pending = store.pending
+        last_moves = store.seal()
+        stats.record_depth(depth, expanded, generated, pruned, pending - len(last_moves), len(last_moves),
+                           len(store))
+        depth += 1
+    stats.finish(False)
+    return None
+
+def _layered_path(store, depth):
+    """The moves from the state of layer 0 to the solved cube, a child of the given layer."""
+    buffer = SOLVED_BUFFER
+    back = []
+    for layer_depth in range(depth, -1, -1):
+        for move_id in range(len(MOVES)):
+            child = apply_move(buffer, move_id)
+            if store.contains(layer_depth, encode_state(child)):
+                back.append(move_id)
+                buffer = child
+                break
+    return [MOVES[INVERSE_MOVE[move_id]] for move_id in reversed(back)]
+
+# Bidirectional BFS
+@_bounded
+def bidirectional_solve(initial_cube, endgame=None, stats=None, limits=None):
+    """
+    Breadth-First Search from the scrambled cube and from the solved cube at the same time.
+    Whole layers are expanded alternately on each side until they meet, which costs about
+    2 * 13.3^(d/2) states for a depth-d solution instead of 13.3^d.
+    Pruning rule: each side only explores canonical move sequences (see ALLOWED_NEXT).
+    endgame: optional endgame.NearSolvedTable that replaces the search from the solved
+    cube: the forward search stops at the first layer that reaches a state in it.
+    stats: optional SearchStats to fill in, with one entry per expanded layer of either side.
+    limits: optional SearchLimits; reaching one raises SearchLimitExceeded.
+    Returns the moves in the same (face, 'C'|'A'|'2') format as bfs_pruning.
+    """
+    if stats is None:
+        stats = SearchStats()
+    initial_state = checked_buffer(initial_cube)
+    if initial_state == SOLVED_BUFFER:
+        stats.finish(True)
+        return []
+    if endgame is not None:
+        return _search_to_endgame(initial_state, endgame, stats, limits)
+    watched = stats.observer is not None or limits is not None
+
+    # One search tree per side, plus a dict from each visited state to its node.
+    sides = []
+    for name, root in (('forward', initial_state), ('backward', SOLVED_BUFFER)):
+        parents, moves = new_search_tree()
+        sides.append({'name': name, 'parents': parents, 'moves': moves, 'nodes': {root: 0}, 'layer': [root],
+                      'depth': 0})
+    forward, backward = sides
+
+    turn = 0
+    while forward['layer'] and backward['layer']:
+        side, other = sides[turn], sides[1 - turn]
+        parents, moves, nodes = side['parents'], side['moves'], side['nodes']
+        best = None  # (total length, forward node, backward node)
+        next_layer = []
+        expanded = generated = pruned = duplicates = 0
+        side_cap = float('inf') if limits is None else limits.state_cap() - len(other['nodes'])
+        for state in side['layer']:
+            expanded += 1
+            if watched and not expanded & 4095:
+                stats.tick(side['depth'], expanded, len(next_layer), len(nodes) + len(other['nodes']))
+                if limits is not None:
+                    limits.check_time(stats)
+            node = nodes[state]
+            allowed = ALLOWED_NEXT[moves[node] if node else START_MOVE]
+            generated += len(allowed)
+            pruned += len(MOVES) - len(allowed)
+            for next_state, move_id in expand(state, allowed):
+                if next_state in nodes:
+                    duplicates += 1
+                    continue
+                parents.append(node)
+                moves.append(move_id)
+                child = len(moves) - 1
+                nodes[next_state] = child
+                next_layer.append(next_state)
+                if len(nodes) > side_cap:
+                    stats.tick(side['depth'], expanded, len(next_layer), len(nodes) + len(other['nodes']))
+                    limits.check(stats)
+                # Every state the other side has reached is a candidate meeting point;
+                # keep the shortest one found in this layer.
+                other_node = other['nodes'].get(next_state)
+                if other_node is not None:
+                    total = _depth(parents, child) + _depth(other['parents'], other_node)
+                    if best is None or total < best[0]:
+                        best = (total, child, other_node) if turn == 0 else (total, other_node, child)
+        stats.record_depth(side['depth'], expanded, generated, pruned, duplicates, len(next_layer),
+                           len(nodes) + len(other['nodes']), side['name'])
+        if best is not None:
+            stats.finish(True)
+            path = reconstruct_path(forward['parents'], forward['moves'], best[1])
+            # The backward half was built from the solved cube, so undo it in reverse order.
+            back_path = reconstruct_path(backward['parents'], backward['moves'], best[2])
+            return path + [MOVES[INVERSE_MOVE[MOVE_IDS[move]]] for move in reversed(back_path)]
+        side['layer'] = next_layer
+        side['depth'] += 1
+        turn = 1 - turn
 
-    print("Number of states explored:", num_explored)
+    stats.finish(False)
     return None  # If no solution is found.
 
+def _search_to_endgame(initial_state, endgame, stats, limits):
+    """
+    Breadth-First Search from the scrambled cube until a layer reaches the near-solved table.
+    Every solution passes through the table within its last endgame.depth moves, so the
+    best total over the first layer with any hit is optimal.
+    """
+    watched = stats.observer is not None or limits is not None
+    state_cap = float('inf') if limits is None else limits.state_cap()
+    parents, moves = new_search_tree()
+    nodes = {initial_state: 0}
+    layer = [initial_state]
+    depth = 0
+    while layer:
+        best = None  # (total length, node, state)
+        for state in layer:
+            distance = endgame.distance(state)
+            if distance is not None:
+                total = depth + distance
+                if best is None or total < best[0]:
+                    best = (total, nodes[state], state)
+        if best is not None:
+            stats.finish(True)
+            _, node, state = best
+            return reconstruct_path(parents, moves, node) + [MOVES[move_id] for move_id in endgame.solve_buffer(state)]
+        next_layer = []
+        expanded = generated = pruned = duplicates = 0
+        for state in layer:
+            expanded += 1
+            if watched and not expanded & 4095:
+                stats.tick(depth, expanded, len(next_layer), len(nodes))
+                if limits is not None:
+                    limits.check_time(stats)
+            node = nodes[state]
+            allowed = ALLOWED_NEXT[moves[node] if node else START_MOVE]
+            generated += len(allowed)
+            pruned += len(MOVES) - len(allowed)
+            for next_state, move_id in expand(state, allowed):
+                if next_state in nodes:
+                    duplicates += 1
+                    continue
+                parents.append(node)
+                moves.append(move_id)
+                nodes[next_state] = len(moves) - 1
+                next_layer.append(next_state)
+                if len(nodes) > state_cap:
+                    stats.tick(depth, expanded, len(next_layer), len(nodes))
+                    limits.check(stats)
+        stats.record_depth(depth, expanded, generated, pruned, duplicates, len(next_layer), len(nodes))
+        layer = next_layer
+        depth += 1
+
+    stats.finish(False)
+    return None  # If no solution is found.
+
+def _depth(parents, node):
+    """Number of moves from the root of a search tree to node."""
+    depth = 0
+    while parents[node] >= 0:
+        node = parents[node]
+        depth += 1
+    return depth
+
   
 # --- New helper functions for file I/O ---
 
@@ -327,9 +1072,11 @@ def scramble_cube_from_file(input_filename, output_filename):
     """
     Read a file containing the initial cube state on the first line and a series of moves (one per line).
     Each move consists of a faceID and a moveID (separated by whitespace).
-    Apply the moves sequentially to obtain a new (scrambled) cube state.
+    The moves are compiled into one sticker permutation (see move_compiler.py) and applied in a single step.
     Finally, write the new state and the initial state (each on its own line) to the output file.
     """
+    from move_compiler import MoveSequence
+
     # Read and parse the input file.
     with open(input_filename, 'r') as file:
         lines = file.readlines()
@@ -341,16 +1088,17 @@ def scramble_cube_from_file(input_filename, output_filename):
     state = parse_cube_state(initial_state_str)
     cube = Cube(state=state)
 
-    # Process each move line.
+    # Check each move line, then apply them all at once.
+    move_ids = []
     for line in lines[1:]:
         move_line = line.strip()
         if not move_line:
             continue  # Skip empty lines.
         parts = move_line.split()
-        if len(parts) != 2:
+        if len(parts) != 2 or tuple(parts) not in MOVE_IDS:
             raise ValueError(f"Invalid move format in line: '{line.strip()}'")
-        face, move = parts
-        cube.move_cube(face, move)
+        move_ids.append(MOVE_IDS[tuple(parts)])
+    cube = MoveSequence(move_ids).apply_cube(cube)
     
     # Get the final state (after applying moves).
     final_state_str = cube.print_cube()
@@ -362,6 +1110,63 @@ def scramble_cube_from_file(input_filename, output_filename):
     
     print(f"Scrambled cube state written to {output_filename}")
 
+def format_moves(moves):
+    """Moves on one line as face/direction pairs, e.g. "F C T A R 2"."""
+    return ' '.join(f"{face} {direction}" for face, direction in moves)
+
+def read_scramble_records(lines):
+    """
+    Read records lazily from an iterable of lines (e.g. an open file): each record
+    is an initial state line followed by its move lines, in the same format as
+    scramble_cube_from_file. Moves are applied as they are read, so only the
+    current cube is held in memory however long the input is.
+    Yields (initial state string, scrambled sticker buffer) for every record.
+    """
+    initial_state_str, buffer = None, None
+    for line_number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue  # Skip empty lines.
+        if ':' in line:
+            if initial_state_str is not None:
+                yield initial_state_str, buffer
+            initial_state_str = line
+            buffer = checked_buffer(Cube(state=parse_cube_state(line)))
+            continue
+        if initial_state_str is None:
+            raise ValueError(f"Move before the first cube state in line {line_number}: '{line}'")
+        parts = line.split()
+        if len(parts) != 2 or tuple(parts) not in MOVE_IDS:
+            raise ValueError(f"Invalid move format in line {line_number}: '{line}'")
+        buffer = apply_move(buffer, MOVE_IDS[tuple(parts)])
+    if initial_state_str is not None:
+        yield initial_state_str, buffer
+
+def scramble_stream(input_filename, output_filename, solver=None, flush_every=100):
+    """
+    Streaming version of scramble_cube_from_file for files with many records.
+    For every record, the scrambled state and the initial state are appended to
+    the output file (each on its own line), followed by the solution line when a
+    solver such as bfs_pruning is given. The output is flushed every flush_every
+    records, so the results written so far survive if the job is killed.
+    Returns the number of records processed.
+    """
+    count = 0
+    with open(input_filename, 'r') as source, open(output_filename, 'a') as out:
+        for initial_state_str, buffer in read_scramble_records(source):
+            out.write(buffer_to_cube(buffer).print_cube() + "\n")
+            out.write(initial_state_str + "\n")
+            if solver is not None:
+                solution_moves = solver(buffer_to_cube(buffer))
+                if solution_moves is None:
+                    out.write("No solution found\n")
+                else:
+                    out.write((format_moves(solution_moves) or "Already solved") + "\n")
+            count += 1
+            if count % flush_every == 0:
+                out.flush()
+    return count
+
 # --- Main function ---
 if __name__ == '__main__':
     # Example usage of the new scrambling function:
@@ -387,7 +1192,9 @@ if __name__ == '__main__':
     print("Scrambled Cube:")
     print(rubiksCube)
     
-    solution_moves = bfs_pruning(rubiksCube)
+    stats = SearchStats()
+    solution_moves = bfs_pruning(rubiksCube, stats=stats)
+    print("Number of states explored:", stats.nodes_expanded)
     
     if solution_moves:
         print("\nSolution found:")
@@ -0,0 +1,285 @@
+"""
+Pattern databases for the IDA* solver.
+
+A pattern database tracks a subset of the corners (or of the edges) and stores,
+for every placement of those pieces, the number of moves needed to bring them
+home. The other pieces are ignored, so the stored distance never overestimates
+the real one and the heuristic stays admissible.
+
+Tables take minutes to generate, so they are built once with
+
+    python pattern_db.py build [--corners 0,1,2,3] [--edges 0,1,2,3] ... [--out DIR]
+
+and written as binary files: a header, the distances packed 4 bits per entry,
+and the coordinate move table as uint32. load() maps a file with mmap, so several
+solver processes on one host share one page-cached copy.
+"""
+import argparse
+import mmap
+import os
+import struct
+import sys
+import time
+import zlib
+from array import array
+from math import perm
+
+from partB import CUBIE_MOVES, MOVES
+
+NO_DISTANCE = 255
+
+# magic, version, kind (0 corner, 1 edge), piece count, pieces, size, move count,
+# max distance, crc32 of the packed distances, crc32 of the move table.
+_HEADER = struct.Struct('<4sHBB12sQBB2xII')
+_MAGIC = b'RCPD'
+_VERSION = 1
+_KINDS = ('corner', 'edge')
+DEFAULT_TABLE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pattern_tables')
+
+def pack_distances(distances):
+    """Pack a bytearray of distances (each < 16) two per byte, even entries in the low nibble."""
+    packed = bytearray((len(distances) + 1) // 2)
+    packed[:len(distances) // 2] = bytes(low | high << 4 for low, high in zip(distances[0::2], distances[1::2]))
+    if len(distances) % 2:
+        packed[-1] = distances[-1]
+    return packed
+
+def _section_offsets(size, move_count):
+    """Byte offsets of the distance section and of the (8-byte aligned) move table."""
+    distances_offset = _HEADER.size
+    moves_offset = distances_offset + (size + 1) // 2
+    moves_offset += -moves_offset % 8
+    return distances_offset, moves_offset, moves_offset + 4 * size * move_count
+
+class PatternDatabase:
+    """
+    Distance table over the positions and orientations of a subset of pieces.
+    kind is 'corner' or 'edge', pieces the cubie indices that are tracked.
+    The coordinate of a placement is the rank of the ordered positions of the
+    tracked pieces, times the orientations packed in base 3 (corners) or 2 (edges).
+    """
+
+    def __init__(self, kind, pieces, distances=None, move_table=None):
+        if kind not in _KINDS:
+            raise ValueError(f"Invalid pattern database kind: {kind}")
+        self.kind = kind
+        self.pieces = tuple(pieces)
+        self.slots = 8 if kind == 'corner' else 12
+        self.orientations = 3 if kind == 'corner' else 2
+        self.ori_count = self.orientations ** len(self.pieces)
+        self.size = perm(self.slots, len(self.pieces)) * self.ori_count
+        # steps[move][position * orientations + ori] -> same for the piece after the move.
+        self.steps = [self._piece_steps(move_id) for move_id in range(len(MOVES))]
+        # Distances packed 4 bits per coordinate (see distance()), and
+        # move_table[coord * len(MOVES) + move_id] -> coordinate after the move.
+        self.distances = distances
+        self.move_table = move_table
+        self._mmap = None
+
+    def _piece_steps(self, move_id):
+        cp, co, ep, eo = CUBIE_MOVES[move_id]
+        perm_, ori = (cp, co) if self.kind == 'corner' else (ep, eo)
+        steps = [0] * (self.slots * self.orientations)
+        for new_position, old_position in enumerate(perm_):
+            for o in range(self.orientations):
+                new_ori = (o + ori[new_position]) % self.orientations
+                steps[old_position * self.orientations + o] = new_position * self.orientations + new_ori
+        return steps
+
+    # --- Coordinates ---
+
+    def rank(self, placement):
+        """Coordinate of a placement: a list of position * orientations + ori, one per tracked piece."""
+        remaining = list(range(self.slots))
+        position_rank = 0
+        ori_rank = 0
+        for i, piece in enumerate(placement):
+            position, ori = divmod(piece, self.orientations)
+            index = remaining.index(position)
+            del remaining[index]
+            position_rank = position_rank * (self.slots - i) + index
+            ori_rank = ori_rank * self.orientations + ori
+        return position_rank * self.ori_count + ori_rank
+
+    def unrank(self, coord):
+        """Inverse of rank."""
+        position_rank, ori_rank = divmod(coord, self.ori_count)
+        k = len(self.pieces)
+        indices = []
+        for i in range(k - 1, -1, -1):
+            position_rank, index = divmod(position_rank, self.slots - i)
+            indices.append(index)
+        oris = []
+        for _ in range(k):
+            ori_rank, ori = divmod(ori_rank, self.orientations)
+            oris.append(ori)
+        remaining = list(range(self.slots))
+        placement = [remaining.pop(index) * self.orientations for index in reversed(indices)]
+        return [piece + ori for piece, ori in zip(placement, reversed(oris))]
+
+    def coordinate(self, cubies):
+        """Coordinate of the tracked pieces in a (cp, co, ep, eo) cubie state."""
+        cp, co, ep, eo = cubies
+        perm_, ori = (cp, co) if self.kind == 'corner' else (ep, eo)
+        placement = []
+        for piece in self.pieces:
+            position = perm_.index(piece)
+            placement.append(position * self.orientations + ori[position])
+        return self.rank(placement)
+
+    def distance(self, coord):
+        """Stored number of moves needed to bring the tracked pieces home."""
+        return (self.distances[coord >> 1] >> ((coord & 1) << 2)) & 15
+
+    @property
+    def solved_coordinate(self):
+        return self.rank([piece * self.orientations for piece in self.pieces])
+
+    # --- Generation ---
+
+    def generate(self):
+        """
+        Fill the distance table (and the coordinate move table used by IDA*) with a
+        breadth-first sweep from the solved placement over the whole coordinate space.
+        """
+        move_count = len(MOVES)
+        table = bytearray([NO_DISTANCE]) * self.size
+        move_table = array('I', bytes(4 * self.size * move_count))
+        start = self.solved_coordinate
+        table[start] = 0
+        layer = [start]
+        depth = 0
+        while layer:
+            next_layer = []
+            for coord in layer:
+                placement = self.unrank(coord)
+                base = coord * move_count
+                for move_id, steps in enumerate(self.steps):
+                    child = self.rank([steps[piece] for piece in placement])
+                    move_table[base + move_id] = child
+                    if table[child] == NO_DISTANCE:
+                        table[child] = depth + 1
+                        next_layer.append(child)
+            layer = next_layer
+            depth += 1
+        if depth > 16:
+            raise ValueError(f"Distances up to {depth - 1} do not fit in 4 bits")
+        self.distances = pack_distances(table)
+        self.move_table = move_table
+        return self
+
+    @property
+    def max_distance(self):
+        return max(max(byte & 15, byte >> 4) for byte in self.distances)
+
+    @property
+    def filename(self):
+        return f"{self.kind}_{'-'.join(str(piece) for piece in self.pieces)}.pdb"
+
+    # --- Files ---
+
+    def save(self, path):
+        """Write the table to path (through a temporary file, so readers never see half a table)."""
+        distances = bytes(self.distances)
+        moves = array('I', self.move_table)
+        if sys.byteorder != 'little':
+            moves.byteswap()
+        moves = moves.tobytes()
+        header = _HEADER.pack(_MAGIC, _VERSION, _KINDS.index(self.kind), len(self.pieces),
+                              bytes(self.pieces), self.size, len(MOVES), self.max_distance,
+                              zlib.crc32(distances), zlib.crc32(moves))
+        distances_offset, moves_offset, _ = _section_offsets(self.size, len(MOVES))
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as file:
+            file.write(header)
+            file.write(distances)
+            file.write(bytes(moves_offset - distances_offset - len(distances)))
+            file.write(moves)
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path, verify=True):
+        """
+        Map a table written by save() without copying it into the process.
+        verify checks both crc32 checksums, which reads the whole file once.
+        """
+        if sys.byteorder != 'little':
+            raise ValueError("Pattern database files can only be mapped on little-endian hosts")
+        with open(path, 'rb') as file:
+            mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(mapped) < _HEADER.size:
+            raise ValueError(f"{path} is too short to be a pattern database")
+        (magic, version, kind, piece_count, pieces, size, move_count, _,
+         distances_crc, moves_crc) = _HEADER.unpack_from(mapped)
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError(f"{path} is not a version {_VERSION} pattern database")
+        if move_count != len(MOVES):
+            raise ValueError(f"{path} was built for {move_count} moves, expected {len(MOVES)}")
+        distances_offset, moves_offset, end = _section_offsets(size, move_count)
+        if len(mapped) != end:
+            raise ValueError(f"{path} is truncated or has trailing data")
+        view = memoryview(mapped)
+        distances = view[distances_offset:distances_offset + (size + 1) // 2]
+        moves = view[moves_offset:end]
+        if verify and (zlib.crc32(distances) != distances_crc or zlib.crc32(moves) != moves_crc):
+            raise ValueError(f"Checksum mismatch in {path}")
+        db = cls(_KINDS[kind], pieces[:piece_count], distances, moves.cast('I'))
+        if db.size != size:
+            raise ValueError(f"{path} has {size} entries, expected {db.size}")
+        db._mmap = mapped
+        return db
+
+    def __repr__(self):
+        return f"PatternDatabase({self.kind!r}, {self.pieces!r}, size={self.size})"
+
+# Default subsets: the top-layer corners, the top-layer edges and the bottom-layer edges.
+# They are small enough to generate in seconds in pure Python.
+DEFAULT_DATABASES = [('corner', (0, 1, 2, 3)), ('edge', (0, 1, 2, 3)), ('edge', (4, 5, 6, 7))]
+
+_default_cache = None
+
+def load_or_generate(kind, pieces, table_dir=DEFAULT_TABLE_DIR):
+    """Map the table from table_dir if the builder wrote it there, otherwise generate it in memory."""
+    db = PatternDatabase(kind, pieces)
+    path = os.path.join(table_dir, db.filename)
+    if os.path.exists(path):
+        return PatternDatabase.load(path)
+    return db.generate()
+
+def default_databases():
+    """The corner database and the two edge-subset databases, loaded once per process."""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = [load_or_generate(kind, pieces) for kind, pieces in DEFAULT_DATABASES]
+    return _default_cache
+
+def build(databases, out_dir=DEFAULT_TABLE_DIR):
+    """Generate and write each (kind, pieces) table, returning the paths written."""
+    os.makedirs(out_dir, exist_ok=True)
+    paths = []
+    for kind, pieces in databases:
+        start = time.time()
+        db = PatternDatabase(kind, pieces).generate()
+        path = os.path.join(out_dir, db.filename)
+        db.save(path)
+        print(f"{path}: {db.size} entries, max distance {db.max_distance}, {time.time() - start:.1f}s")
+        paths.append(path)
+    return paths
+
+def _pieces(text):
+    return tuple(int(piece) for piece in text.split(','))
+
+# --- Main function ---
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Build pattern database files for the IDA* solver.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build_parser = subparsers.add_parser('build', help="generate tables and write them to disk")
+    build_parser.add_argument('--corners', type=_pieces, action='append', default=[],
+                              help="comma-separated corner indices to track, may be repeated")
+    build_parser.add_argument('--edges', type=_pieces, action='append', default=[],
+                              help="comma-separated edge indices to track, may be repeated")
+    build_parser.add_argument('--out', default=DEFAULT_TABLE_DIR, help="output directory")
+    args = parser.parse_args()
+
+    requested = [('corner', pieces) for pieces in args.corners] + [('edge', pieces) for pieces in args.edges]
+    build(requested or DEFAULT_DATABASES, args.out)
@@ -0,0 +1,151 @@
+"""
+Cache of solutions in front of the solvers.
+
+Entries are keyed by the symmetry class of the state (see symmetry.py), packed
+into the 9-byte state code of its representative, and hold the solution of the
+representative as one byte per move. A state that is a rotated or mirrored copy
+of a cached one is a hit too: the stored moves are conjugated back to the
+caller's orientation.
+
+The cache is bounded by entry count and/or bytes and evicts the least recently
+used entries. With a path, every new entry is appended to a log file that is
+read back when the cache is created, and close() compacts the file to the live
+entries.
+"""
+import os
+from collections import OrderedDict
+
+from cubie import STATE_BYTES, encode_state, pack_state
+from partB import MOVE_IDS, MOVES, checked_buffer
+from symmetry import MOVE_CONJ, canonical_form, conjugate_moves
+
+# Rough per-entry overhead of the OrderedDict and the bytes objects, for max_bytes.
+_ENTRY_OVERHEAD = 150
+
+class SolutionCache:
+    """
+    LRU map from symmetry class to solution.
+    max_entries / max_bytes: bounds (None for no bound); bytes are estimated.
+    path: optional log file that persists entries across runs.
+    """
+
+    def __init__(self, max_entries=100000, max_bytes=None, path=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.path = path
+        self.entries = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._log = None
+        if path is not None:
+            if os.path.exists(path):
+                self._load(path)
+            self._log = open(path, 'ab')
+
+    # --- Lookups ---
+
+    def _key(self, buffer):
+        representative, sym = canonical_form(buffer)
+        return pack_state(encode_state(representative)), sym
+
+    def get(self, buffer):
+        """Cached move indices that solve the sticker buffer, or None."""
+        key, sym = self._key(buffer)
+        moves = self.entries.get(key)
+        if moves is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return conjugate_moves(moves, sym)
+
+    def put(self, buffer, move_ids):
+        """Store move indices that solve the sticker buffer."""
+        key, sym = self._key(buffer)
+        conj = MOVE_CONJ[sym]
+        moves = bytes(conj[move_id] for move_id in move_ids)
+        if len(moves) > 255:
+            return  # The log stores the length in one byte.
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            return
+        self._insert(key, moves)
+        if self._log is not None:
+            self._log.write(key + bytes((len(moves),)) + moves)
+
+    def _insert(self, key, moves):
+        old = self.entries.pop(key, None)
+        if old is not None:
+            self.nbytes -= len(key) + len(old) + _ENTRY_OVERHEAD
+        self.entries[key] = moves
+        self.nbytes += len(key) + len(moves) + _ENTRY_OVERHEAD
+        while self.entries and ((self.max_entries is not None and len(self.entries) > self.max_entries) or
+                                (self.max_bytes is not None and self.nbytes > self.max_bytes)):
+            old_key, old_moves = self.entries.popitem(last=False)
+            self.nbytes -= len(old_key) + len(old_moves) + _ENTRY_OVERHEAD
+            self.evictions += 1
+
+    def __len__(self):
+        return len(self.entries)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {'entries': len(self.entries), 'bytes': self.nbytes, 'hits': self.hits, 'misses': self.misses,
+                'evictions': self.evictions, 'hit_rate': self.hits / lookups if lookups else 0.0}
+
+    # --- Persistence ---
+
+    def _load(self, path):
+        """Replay a log file; later records win and the usual bounds apply."""
+        with open(path, 'rb') as file:
+            data = file.read()
+        offset = 0
+        while offset + STATE_BYTES + 1 <= len(data):
+            key = data[offset:offset + STATE_BYTES]
+            length = data[offset + STATE_BYTES]
+            start = offset + STATE_BYTES + 1
+            if start + length > len(data):
+                break  # A record cut short by a crash; drop it.
+            self._insert(key, data[start:start + length])
+            offset = start + length
+
+    def flush(self):
+        if self._log is not None:
+            self._log.flush()
+
+    def close(self):
+        """Rewrite the log with only the live entries (through a temporary file)."""
+        if self._log is None:
+            return
+        self._log.close()
+        self._log = None
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as file:
+            for key, moves in self.entries.items():
+                file.write(key + bytes((len(moves),)) + moves)
+        os.replace(temp_path, self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def cached(solver, cache):
+    """
+    Wrap a solver entry point (Cube -> list of (face, direction) moves or None)
+    so that it answers from the cache when it can and fills it otherwise.
+    """
+    def solve(initial_cube, *args, **kwargs):
+        buffer = checked_buffer(initial_cube)
+        move_ids = cache.get(buffer)
+        if move_ids is not None:
+            return [MOVES[move_id] for move_id in move_ids]
+        solution_moves = solver(initial_cube, *args, **kwargs)
+        if solution_moves is not None:
+            cache.put(buffer, [MOVE_IDS[move] for move in solution_moves])
+        return solution_moves
+    solve.cache = cache
+    return solve
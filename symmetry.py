@@ -0,0 +1,167 @@
+"""
+The 48 symmetries of the cube (24 rotations, each with or without a mirror).
+
+Conjugating a state by a symmetry, i.e. looking at the whole cube from another
+side (or in a mirror) and renaming the colours so the centres match again, keeps
+its distance to the solved cube. Tables can therefore store one representative
+per symmetry class: the smallest face-label buffer among the 48 conjugates
+(canonical_key). A class holds up to 48 states, so a table is up to 48 times
+smaller at the same depth, and building it visits that many fewer states; this
+is used by the symmetric near-solved tables (endgame.py) and solution_cache.py.
+Finding the representative costs 48 conjugations, so it does not pay off in a
+search from a scramble, where few states at one depth share a class.
+
+Moves conjugate too: MOVE_CONJ[sym][move_id] is the move that does to the
+conjugated cube what move_id does to the original. conjugate_moves maps a
+solution found for a representative back to the caller's orientation.
+"""
+from collections import deque
+from itertools import permutations, product
+from operator import itemgetter
+
+from cubie import CORNER_FACELETS, CORNER_NAMES, EDGE_FACELETS, EDGE_NAMES, encode_state, face_labels
+from partB import FACE_ORDER, INVERSE_MOVE, MOVE_PERMS, SOLVED_BUFFER, START_MOVE, apply_move
+
+N_SYMMETRIES = 48
+
+# Outward normal of each face; the cube is centred on the origin.
+_NORMALS = {'T': (0, 1, 0), 'B': (0, -1, 0), 'R': (1, 0, 0), 'L': (-1, 0, 0), 'F': (0, 0, 1), 'A': (0, 0, -1)}
+
+def _sticker_positions():
+    """(cubie position, face normal) of every sticker, a 3D key that symmetries act on."""
+    positions = [None] * 54
+    for face_index, face in enumerate(FACE_ORDER):
+        positions[face_index * 9 + 4] = (_NORMALS[face], _NORMALS[face])
+    for names, facelet_lists in ((CORNER_NAMES, CORNER_FACELETS), (EDGE_NAMES, EDGE_FACELETS)):
+        for name, facelets in zip(names, facelet_lists):
+            cubie = tuple(map(sum, zip(*(_NORMALS[face] for face in name))))
+            for facelet in facelets:
+                positions[facelet] = (cubie, _NORMALS[FACE_ORDER[facelet // 9]])
+    return positions
+
+def _transform(matrix, vector):
+    return tuple(sum(m * v for m, v in zip(row, vector)) for row in matrix)
+
+def _build_symmetries():
+    """
+    Sticker permutations (new[i] == old[perm[i]], like MOVE_PERMS) of the 48 signed
+    permutation matrices, the identity first.
+    """
+    positions = _sticker_positions()
+    index = {position: i for i, position in enumerate(positions)}
+    perms = []
+    for axes in permutations(range(3)):
+        for signs in product((1, -1), repeat=3):
+            matrix = [[signs[row] if column == axes[row] else 0 for column in range(3)] for row in range(3)]
+            perm = [0] * 54
+            for i, (cubie, normal) in enumerate(positions):
+                perm[index[(_transform(matrix, cubie), _transform(matrix, normal))]] = i
+            perms.append(tuple(perm))
+    return perms
+
+SYMMETRY_PERMS = _build_symmetries()
+_SYMMETRY_GETTERS = [itemgetter(*perm) for perm in SYMMETRY_PERMS]
+SYMMETRY_INVERSE = [SYMMETRY_PERMS.index(tuple(sorted(range(54), key=perm.__getitem__))) for perm in SYMMETRY_PERMS]
+
+def _relabel_table(perm):
+    """Translation that renames face labels after perm, so every centre gets its face's label back."""
+    moved = bytes(itemgetter(*perm)(face_labels(SOLVED_BUFFER)))
+    table = bytearray(range(256))
+    for face_index in range(6):
+        table[moved[face_index * 9 + 4]] = face_index
+    return bytes(table)
+
+_RELABEL = [_relabel_table(perm) for perm in SYMMETRY_PERMS]
+
+def _conjugate_move(perm, move_id):
+    inverse = sorted(range(54), key=perm.__getitem__)
+    move = MOVE_PERMS[move_id]
+    return MOVE_PERMS.index(tuple(inverse[move[perm[i]]] for i in range(54)))
+
+# MOVE_CONJ[sym][move_id]: apply_symmetry(apply_move(b, m)) == apply_move(apply_symmetry(b), MOVE_CONJ[sym][m]).
+MOVE_CONJ = [[_conjugate_move(perm, move_id) for move_id in range(len(MOVE_PERMS))] for perm in SYMMETRY_PERMS]
+
+def apply_symmetry(buffer, sym):
+    """Face-label buffer of the cube conjugated by symmetry sym."""
+    return bytes(_SYMMETRY_GETTERS[sym](face_labels(buffer))).translate(_RELABEL[sym])
+
+def canonical_form(buffer):
+    """(representative, sym): the smallest conjugate of the buffer and the symmetry that gives it."""
+    labels = face_labels(buffer)
+    best, best_sym = None, 0
+    for sym, (getter, table) in enumerate(zip(_SYMMETRY_GETTERS, _RELABEL)):
+        key = bytes(getter(labels)).translate(table)
+        if best is None or key < best:
+            best, best_sym = key, sym
+    return best, best_sym
+
+def canonical_key(buffer):
+    """Face-label buffer that is the same for every state of a symmetry class."""
+    labels = face_labels(buffer)
+    return min([bytes(getter(labels)).translate(table) for getter, table in zip(_SYMMETRY_GETTERS, _RELABEL)])
+
+def canonical_code(buffer):
+    """canonical_key as a compact state code, as stored in a symmetric endgame.NearSolvedTable."""
+    return encode_state(canonical_key(buffer))
+
+def conjugate_moves(move_ids, sym):
+    """
+    Map moves that solve apply_symmetry(b, sym) to moves that solve b itself.
+    """
+    conj = MOVE_CONJ[SYMMETRY_INVERSE[sym]]
+    return [conj[move_id] for move_id in move_ids]
+
+# --- Symmetry-reduced tables ---
+
+# Successor moves for searches that keep one state per class. Only turns of the
+# same face are skipped: they give a state one move closer to the parent, whose
+# class has been reached already. partB.ALLOWED_NEXT also orders opposite faces,
+# which is not safe here, since the state kept for a class need not be the one
+# reached through the other order.
+SYMMETRIC_NEXT = [tuple(move_id for move_id in range(len(MOVE_PERMS)) if move_id // 3 != last_move // 3)
+                  for last_move in range(START_MOVE + 1)]
+
+def generate_class_table(max_depth):
+    """
+    Breadth-first sweep from the solved cube that stores one entry per symmetry class:
+    {canonical_key: (distance, move)} for every state within max_depth moves, where
+    move is the first move of an optimal solution of the representative itself
+    (START_MOVE for the solved class). endgame.NearSolvedTable builds its
+    symmetric tables from it.
+    """
+    solved = canonical_key(SOLVED_BUFFER)
+    table = {solved: (0, START_MOVE)}
+    frontier = deque([(SOLVED_BUFFER, START_MOVE, 0)])
+    while frontier:
+        state, last_move, depth = frontier.popleft()
+        if depth == max_depth:
+            continue
+        for move_id in SYMMETRIC_NEXT[last_move]:
+            child = apply_move(state, move_id)
+            key, sym = canonical_form(child)
+            if key not in table:
+                # Undoing move_id is the child's first step home; conjugated, the representative's.
+                table[key] = (depth + 1, MOVE_CONJ[sym][INVERSE_MOVE[move_id]])
+                frontier.append((child, move_id, depth + 1))
+    return table
+
+def table_solution(lookup, buffer):
+    """
+    Solve a cube from a class table: lookup maps a canonical_key to its
+    (distance, move) entry (see generate_class_table), or None when the class is
+    not in the table; a dict's get will do. Each step takes the stored move of the
+    representative, conjugated back to the cube as given.
+    Returns the move ids, or None if the class is not in the table.
+    """
+    path = []
+    while True:
+        key, sym = canonical_form(buffer)
+        entry = lookup(key)
+        if entry is None:
+            return None
+        distance, move_id = entry
+        if not distance:
+            return path
+        move_id = conjugate_moves([move_id], sym)[0]
+        path.append(move_id)
+        buffer = apply_move(buffer, move_id)
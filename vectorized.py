@@ -0,0 +1,207 @@
+"""
+Layer-at-a-time search with NumPy.
+
+A layer of N states is an (N, 54) uint8 array of face labels (see
+cubie.face_labels). All moves are applied at once with fancy indexing,
+states[:, MOVE_PERM_ARRAY], giving every child of a chunk of the layer in one
+array operation. Children are deduplicated with np.unique on packed keys: the
+48 non-centre stickers take 3 bits each, so a state fits in three uint64 words.
+
+state_codes turns a layer into the packed cubie.encode_state codes the tables
+and files store, with the cubie readings and permutation ranks done as array
+operations too; endgame.NearSolvedTable.generate builds its table from layers()
+this way when NumPy is installed.
+
+Measured on one core, layer_sizes(5) (621649 states) takes 1.6 to 3.7 s, 170k
+to 390k states per second: 8 to 20 times bfs_pruning, whose pure-Python loop
+does about 20k. The table builds gain less, since the codes are combined in
+Python: NearSolvedTable.generate(5) takes 3.3 s against 20 s.
+
+NumPy is optional (see requirements-optional.txt); the rest of the package works
+without it, and the functions here raise ImportError when it is missing.
+"""
+from cubie import (_CORNER_CUBIE, _CORNER_ORI, _EDGE_CUBIE, _EDGE_ORI, CENTER_FACELETS, CORNER_FACELETS,
+                   EDGE_FACELETS, N_CORNER_ORI, N_EDGE_ORI, N_EDGE_PERM_HALF, face_labels, pack_state)
+from partB import (ALLOWED_NEXT, MOVES, MOVE_PERMS, SOLVED_BUFFER, START_MOVE, SearchStats, checked_buffer,
+                   cube_to_buffer)
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+DEFAULT_CHUNK = 1 << 16  # parent states expanded per array operation
+
+if np is not None:
+    MOVE_PERM_ARRAY = np.array(MOVE_PERMS, dtype=np.intp)
+    # ALLOWED_MASK[last_move, move_id]: move_id keeps the sequence canonical (see partB.ALLOWED_NEXT).
+    ALLOWED_MASK = np.zeros((len(ALLOWED_NEXT), len(MOVES)), dtype=bool)
+    for _last_move, _allowed in enumerate(ALLOWED_NEXT):
+        ALLOWED_MASK[_last_move, list(_allowed)] = True
+    _STICKERS = np.array([i for i in range(54) if i not in CENTER_FACELETS], dtype=np.intp)
+    _SHIFTS = np.arange(16, dtype=np.uint64) * np.uint64(3)
+    KEY_DTYPE = np.dtype([('high', '<u8'), ('middle', '<u8'), ('low', '<u8')])
+    # Facelets of each corner and edge position, and their readings (the face labels
+    # as a base-6 number) -> cubie and orientation, as in cubie.facelets_to_cubies.
+    _CORNER_STICKERS = np.array(CORNER_FACELETS, dtype=np.intp)
+    _EDGE_STICKERS = np.array(EDGE_FACELETS, dtype=np.intp)
+    _CORNER_READING = np.zeros((2, 6 ** 3), dtype=np.uint8)
+    for (_a, _b, _c), _cubie in _CORNER_CUBIE.items():
+        _CORNER_READING[:, (_a * 6 + _b) * 6 + _c] = _cubie, _CORNER_ORI[(_a, _b, _c)]
+    _EDGE_READING = np.zeros((2, 6 ** 2), dtype=np.uint8)
+    for (_a, _b), _cubie in _EDGE_CUBIE.items():
+        _EDGE_READING[:, _a * 6 + _b] = _cubie, _EDGE_ORI[(_a, _b)]
+
+_EDGE_FACTOR = N_EDGE_PERM_HALF * N_EDGE_ORI
+
+def _require_numpy():
+    if np is None:
+        raise ImportError("The vectorized search needs NumPy (pip install numpy)")
+
+def to_array(buffers):
+    """(N, 54) uint8 face-label array of sticker buffers."""
+    _require_numpy()
+    data = b''.join(face_labels(buffer) for buffer in buffers)
+    return np.frombuffer(data, dtype=np.uint8).reshape(-1, 54).copy()
+
+def pack_keys(states):
+    """One KEY_DTYPE key per row; equal keys mean equal states and key order is a total order."""
+    stickers = states[:, _STICKERS].astype(np.uint64).reshape(-1, 3, 16)
+    words = np.bitwise_or.reduce(stickers << _SHIFTS, axis=2)
+    return np.ascontiguousarray(words).view(KEY_DTYPE).ravel()
+
+def expand_batch(states, last_moves=None):
+    """
+    Apply every move to every row of states at once.
+    Returns (children, parent row, move id); with last_moves (one move id per row,
+    START_MOVE for the root) only the canonical children are kept.
+    """
+    _require_numpy()
+    count, move_count = len(states), len(MOVES)
+    children = states[:, MOVE_PERM_ARRAY].reshape(count * move_count, 54)
+    parents = np.repeat(np.arange(count), move_count)
+    move_ids = np.tile(np.arange(move_count, dtype=np.uint8), count)
+    if last_moves is not None:
+        keep = ALLOWED_MASK[last_moves].ravel()
+        children, parents, move_ids = children[keep], parents[keep], move_ids[keep]
+    return children, parents, move_ids
+
+# --- State codes ---
+
+def permutation_ranks(perms):
+    """Lexicographic ranks (see cubie.permutation_rank) of the rows of an array of permutations."""
+    n = perms.shape[1]
+    ranks = np.zeros(len(perms), dtype=np.int64)
+    for i in range(n):
+        ranks = ranks * (n - i) + (perms[:, i + 1:] < perms[:, i:i + 1]).sum(axis=1)
+    return ranks
+
+def digits_value(values, base):
+    """The number each row of an array of digits spells in the given base."""
+    number = np.zeros(len(values), dtype=np.int64)
+    for column in range(values.shape[1]):
+        number = number * base + values[:, column]
+    return number
+
+def cubie_codes(cp, co, ep, eo):
+    """cubie.encode_cubies of every row of cubie arrays, packed (cubie.pack_state) into one bytes."""
+    corner_part = permutation_ranks(cp) * N_CORNER_ORI + digits_value(co[:, :7], 3)
+    edge_part = permutation_ranks(ep) // 2 * N_EDGE_ORI + digits_value(eo[:, :11], 2)
+    # The code does not fit in 64 bits: combine its corner and edge halves as Python integers.
+    return b''.join(pack_state(corner * _EDGE_FACTOR + edge)
+                    for corner, edge in zip(corner_part.tolist(), edge_part.tolist()))
+
+def state_codes(states):
+    """cubie.encode_state of every row of a face-label array of valid states, packed into one bytes."""
+    _require_numpy()
+    corners = states[:, _CORNER_STICKERS].astype(np.intp)
+    corners = _CORNER_READING[:, (corners[:, :, 0] * 6 + corners[:, :, 1]) * 6 + corners[:, :, 2]]
+    edges = states[:, _EDGE_STICKERS].astype(np.intp)
+    edges = _EDGE_READING[:, edges[:, :, 0] * 6 + edges[:, :, 1]]
+    return cubie_codes(corners[0], corners[1], edges[0], edges[1])
+
+# --- Layers ---
+
+class Layer:
+    """One BFS layer: the states, their sorted unique keys, and how each was reached."""
+
+    def __init__(self, states, keys, parents, last_moves):
+        self.states = states
+        self.keys = keys
+        self.parents = parents
+        self.last_moves = last_moves
+
+    def __len__(self):
+        return len(self.states)
+
+def _start_layer(buffer):
+    states = to_array([buffer])
+    return Layer(states, pack_keys(states), np.array([-1]), np.array([START_MOVE], dtype=np.uint8))
+
+def next_layer(current, known_keys, chunk_size=DEFAULT_CHUNK):
+    """
+    Expand a layer and keep the children that are new: not in known_keys (the
+    sorted keys of the layers a child could already be in) and not repeated.
+    """
+    parts = []
+    for start in range(0, len(current), chunk_size):
+        stop = start + chunk_size
+        children, parents, move_ids = expand_batch(current.states[start:stop], current.last_moves[start:stop])
+        keys = pack_keys(children)
+        keys, first = np.unique(keys, return_index=True)
+        fresh = np.ones(len(keys), dtype=bool)
+        for known in known_keys:
+            fresh &= ~np.isin(keys, known, assume_unique=True)
+        first = first[fresh]
+        parts.append((keys[fresh], children[first], parents[first] + start, move_ids[first]))
+    if not parts:
+        return Layer(current.states[:0], current.keys[:0], np.array([], dtype=np.intp), current.last_moves[:0])
+    keys = np.concatenate([part[0] for part in parts])
+    keys, first = np.unique(keys, return_index=True)
+    return Layer(np.concatenate([part[1] for part in parts])[first], keys,
+                 np.concatenate([part[2] for part in parts])[first],
+                 np.concatenate([part[3] for part in parts])[first])
+
+def layers(start=SOLVED_BUFFER, max_depth=None, chunk_size=DEFAULT_CHUNK):
+    """Yield the layers at distance 0, 1, ... from a sticker buffer, up to max_depth."""
+    _require_numpy()
+    previous, current = None, _start_layer(start)
+    depth = 0
+    while len(current):
+        yield current
+        if depth == max_depth:
+            return
+        known = [current.keys] if previous is None else [previous.keys, current.keys]
+        previous, current = current, next_layer(current, known, chunk_size)
+        depth += 1
+
+def layer_sizes(max_depth, initial_cube=None, chunk_size=DEFAULT_CHUNK):
+    """Number of states at each distance 0..max_depth from initial_cube (default: the solved cube)."""
+    start = SOLVED_BUFFER if initial_cube is None else cube_to_buffer(initial_cube)
+    return [len(layer) for layer in layers(start, max_depth, chunk_size)]
+
+def vectorized_bfs_solve(initial_cube, max_depth=20, chunk_size=DEFAULT_CHUNK, limits=None):
+    """
+    Breadth-first search for the solved cube, one NumPy layer at a time.
+    limits: optional partB.SearchLimits, checked after every layer.
+    Returns the (face, 'C'|'A'|'2') moves of an optimal solution, or None.
+    """
+    goal = pack_keys(to_array([SOLVED_BUFFER]))
+    history = []
+    stats = SearchStats()
+    visited = 0
+    for depth, layer in enumerate(layers(checked_buffer(initial_cube), max_depth, chunk_size)):
+        history.append(layer)
+        visited += len(layer)
+        index = np.searchsorted(layer.keys, goal[0])
+        if index < len(layer) and layer.keys[index] == goal[0]:
+            path = []
+            for past in reversed(history[1:]):
+                path.append(MOVES[past.last_moves[index]])
+                index = past.parents[index]
+            path.reverse()
+            return path
+        if limits is not None:
+            stats.tick(depth, 0, len(layer), visited)
+            limits.check(stats)
+    return None